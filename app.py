@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import os
 from pathlib import Path
 import yaml
 from dotenv import load_dotenv
@@ -7,13 +8,18 @@ from modules.crawl import crawl_from_input
 import modules.analyze as analyze
 from modules.cluster import cluster_pages
 from modules.links import suggest_links
-from modules.briefs import generate_briefs, export_briefs_csv
+from modules.linkgraph import link_metrics
+from modules.artifacts import site_dir, publish, digest_arrays
+from modules.aggregates import build_cluster_aggregates, cluster_descriptors
+from modules.briefs import iter_briefs, export_briefs_csv
+from modules.exports import write_table, read_head, mime_type, session_dir, EXTENSIONS
 from modules.search_providers import web_search_note
+from modules import registry
 
 # --- CACHE : évite de relancer les gros calculs à chaque interaction ---
 @st.cache_data(show_spinner=False)
 def _cache_crawl(text_input, input_mode, cfg):
-    return crawl_from_input(text_input, input_mode, cfg)
+    return crawl_from_input(text_input, input_mode, cfg, return_graph=True)
 
 @st.cache_data(show_spinner=False)
 def _cache_analyze(docs, cfg):
@@ -21,7 +27,15 @@ def _cache_analyze(docs, cfg):
 
 @st.cache_data(show_spinner=False)
 def _cache_cluster(_analysis, cfg):  # <-- le underscore est crucial ici
-    return cluster_pages(_analysis, cfg)
+    return cluster_pages(_analysis, cfg, return_embeddings=True)
+
+def _download_export(label, path):
+    # Sert le fichier déjà écrit dans le dossier d'export de la session (pas de re-sérialisation)
+    with open(path, "rb") as fh:
+        st.download_button(label, fh, file_name=os.path.basename(path), mime=mime_type(path))
+
+def _is_current(path, fmt):
+    return bool(path) and path.endswith(EXTENSIONS[fmt]) and os.path.exists(path)
 
 # Configuration de la page Streamlit
 st.set_page_config(page_title="Semantic Cluster Tool", layout="wide")
@@ -30,11 +44,15 @@ load_dotenv()
 # --- STATE: initialisation des clés ---
 for key, default in [
     ("docs", None),
+    ("graph", None),
     ("analysis", None),
     ("clusters", None),
     ("sim", None),
+    ("aggregates", None),
+    ("artifacts", None),
     ("links_df", None),
-    ("briefs_df", None),
+    ("links_path", None),
+    ("briefs_path", None),
 ]:
     if key not in st.session_state:
         st.session_state[key] = default
@@ -46,11 +64,31 @@ st.caption("Crawl • TF-IDF • Cooccurrences • NER • Similarités • Clus
 cfg_path = Path("config.yaml")
 cfg = yaml.safe_load(cfg_path.read_text()) if cfg_path.exists() else {}
 
+# Dossier d'export propre à la session : deux sessions ne servent jamais les fichiers l'une de l'autre.
+# Les dossiers des sessions inactives depuis session_ttl_hours sont purgés à l'ouverture d'une session.
+if "export_dir" not in st.session_state:
+    exp_cfg = cfg.get("exports", {})
+    st.session_state.export_dir = session_dir(exp_cfg.get("root", "exports"), float(exp_cfg.get("session_ttl_hours", 24)))
+export_dir = st.session_state.export_dir
+
+# Préchargement spaCy / SentenceTransformer en arrière-plan (une fois par process) :
+# l'UI s'affiche tout de suite, la 1re analyse réutilise les modèles déjà chargés
+if cfg.get("models", {}).get("preload", True) and cfg.get("nlp"):
+    registry.preload(cfg)
+
 # Barre latérale avec la config
 with st.sidebar:
     st.header("Configuration")
     st.code(Path("config.yaml").read_text(), language="yaml")
     st.info(web_search_note())
+    with st.expander("Temps d'import / chargement des modèles"):
+        if registry.preload_running():
+            st.caption("Préchargement des modèles en cours…")
+        st.dataframe(registry.timings())
+    export_cfg = cfg.get("exports", {})
+    formats = list(EXTENSIONS)
+    export_fmt = st.selectbox("Format d'export", formats, index=formats.index(export_cfg.get("format", "csv")))
+    chunk_rows = int(export_cfg.get("chunk_rows", 5000))
 
 # Étape 1 — Ingestion
 st.subheader("1) Ingestion")
@@ -60,8 +98,9 @@ start = st.button("Lancer le crawl")
 
 if start and text_input.strip():
     with st.spinner("Crawl en cours…"):
-        docs = _cache_crawl(text_input, input_mode, cfg)
+        docs, graph = _cache_crawl(text_input, input_mode, cfg)
     st.session_state.docs = docs
+    st.session_state.graph = graph
 
 if st.session_state.docs:
     docs = st.session_state.docs
@@ -82,42 +121,48 @@ if st.session_state.docs:
     # Étape 3 — Clustering & similarités
     if st.session_state.clusters is None or st.session_state.sim is None:
         st.subheader("3) Clustering & similarités")
-        st.session_state.clusters, st.session_state.sim = _cache_cluster(analysis, cfg)
+        st.session_state.clusters, sim, emb = _cache_cluster(analysis, cfg)
+        st.session_state.sim = sim
+        st.session_state.aggregates = None
+
+        # Artefacts partagés : TF-IDF (et comptes bruts), embeddings, similarités et voisins en mmap lecture seule,
+        # la session ne garde plus sa propre copie (les pages sont partagées par l'OS)
+        art_cfg = cfg.get("artifacts", {})
+        if art_cfg.get("enabled", True):
+            site = site_dir([p["url"] for p in analysis["pages"]], cfg, art_cfg.get("root", "artifacts"),
+                            digest_arrays(analysis, sim))
+            shared = publish(site, analysis, sim, emb, int(art_cfg.get("neighbors_k", 20)), int(art_cfg.get("keep_per_domain", 3)))
+            # garde-fou : ne remplace les copies mémoire que si les formes correspondent aux pages
+            if shared["tfidf_X"].shape == analysis["tfidf_X"].shape and shared["sim"].shape == (len(analysis["pages"]),) * 2:
+                analysis["tfidf_X"] = shared["tfidf_X"]
+                if shared["counts_X"] is not None and shared["counts_X"].shape == analysis["counts_X"].shape:
+                    analysis["counts_X"] = shared["counts_X"]
+                st.session_state.sim = shared["sim"]
+                st.session_state.artifacts = {"dir": site, **shared}
+        del sim, emb
+
+    # Agrégats par cluster (indicatrice creuse clusters × pages), calculés une fois par clustering
+    if st.session_state.aggregates is None:
+        st.session_state.aggregates = build_cluster_aggregates(analysis, st.session_state.clusters)
 
     clusters, sim = st.session_state.clusters, st.session_state.sim
     st.subheader("3) Clustering & similarités")
     st.success(f"{clusters['cluster'].nunique()} clusters trouvés.")
+    emb_stats = clusters.attrs.get("embedding_stats")
+    if emb_stats:
+        st.caption(f"Embeddings : {emb_stats['texts_per_sec']} textes/s — backend {emb_stats['backend']}, stockage {emb_stats['storage_dtype']}")
     st.write("Répartition par cluster :")
     st.dataframe(clusters['cluster'].value_counts().rename_axis('cluster').reset_index(name='pages'))
     st.dataframe(clusters.head(30))
 
-    # --- Descripteurs par cluster (top termes TF-IDF) ---
-    def top_terms_by_cluster(analysis, clusters, topn=10):
-        # moyenne TF-IDF par cluster
-        X = analysis["tfidf_X"]
-        vocab = analysis["vocab"]
-        pages = analysis["pages"]
-        import numpy as np, pandas as pd
-
-        url_to_idx = {p["url"]: i for i, p in enumerate(pages)}
-        rows = []
-        for c_id, sub in clusters.groupby("cluster"):
-            idxs = [url_to_idx[u] for u in sub["url"].tolist() if u in url_to_idx]
-            if not idxs:
-                continue
-            vec = X[idxs].mean(axis=0).A1
-            top_idx = vec.argsort()[::-1][:topn]
-            terms = [vocab[i] for i in top_idx if vec[i] > 0]
-            rows.append({"cluster": int(c_id), "top_terms": ", ".join(terms)})
-        return pd.DataFrame(rows)
-
+    # --- Descripteurs par cluster (centroïdes TF-IDF, c-TF-IDF, entités, n-grams) ---
     st.write("Descripteurs de clusters (top termes) :")
-    st.dataframe(top_terms_by_cluster(analysis, clusters, topn=10))
+    st.dataframe(cluster_descriptors(st.session_state.aggregates, topn=10))
 
     # Étape 4 — Liens internes & ancres
     st.subheader("4) Liens internes & ancres")
     if st.session_state.links_df is None:
-        st.session_state.links_df = suggest_links(analysis, clusters, sim, cfg)
+        st.session_state.links_df = suggest_links(analysis, clusters, sim, cfg, graph=st.session_state.graph)
 
         # Fallback pour target_title s'il manque
         links_df_tmp = st.session_state.links_df.copy()
@@ -133,50 +178,44 @@ if st.session_state.docs:
         st.session_state.links_df = links_df_tmp
 
     links_df = st.session_state.links_df
+    if st.session_state.graph is not None:
+        metrics = link_metrics(st.session_state.graph)
+        st.write(f"Graphe interne : {int(st.session_state.graph['adj'].nnz)} liens existants, {int(metrics['orpheline'].sum())} page(s) orpheline(s).")
+        st.dataframe(metrics.sort_values("pagerank", ascending=False).head(20))
     st.dataframe(links_df.head(40))
-    st.download_button(
-        "Télécharger la matrice de liens (CSV)",
-        links_df.to_csv(index=False).encode("utf-8"),
-        "matrice_liens.csv"
-    )
+    if not _is_current(st.session_state.links_path, export_fmt):
+        st.session_state.links_path = write_table(links_df, os.path.join(export_dir, "matrice_liens.csv"), export_fmt, chunk_rows)
+    _download_export(f"Télécharger la matrice de liens ({export_fmt.upper()})", st.session_state.links_path)
 
     # Étape 5 — Briefs lexicaux
     st.subheader("5) Briefs lexicaux")
-    if st.session_state.briefs_df is None:
-        st.session_state.briefs_df = generate_briefs(analysis, clusters, cfg)
-
-    briefs_df = st.session_state.briefs_df
-    st.dataframe(briefs_df.head(40))
-    st.download_button(
-        "Télécharger les briefs (CSV)",
-        briefs_df.to_csv(index=False).encode("utf-8"),
-        "briefs_lexicaux.csv"
-    )
-    export_briefs_csv(briefs_df)
-    st.success("Exports CSV générés dans le dossier ./exports")
+    if not _is_current(st.session_state.briefs_path, export_fmt):
+        # écriture en flux : les lignes sont écrites par chunks sans DataFrame complet
+        st.session_state.briefs_path = export_briefs_csv(
+            iter_briefs(analysis, clusters, cfg), os.path.join(export_dir, "briefs_lexicaux.csv"),
+            fmt=export_fmt, chunk_rows=chunk_rows
+        )
+
+    briefs_path = st.session_state.briefs_path
+    st.dataframe(read_head(briefs_path, 40))
+    _download_export(f"Télécharger les briefs ({export_fmt.upper()})", briefs_path)
+    st.success(f"Exports générés dans le dossier ./{export_dir} ({export_fmt})")
 
     # 6) Briefs enrichis (beaucoup plus fournis)
     st.subheader("6) Briefs enrichis (TERMES + ENTITÉS + COOC + QUESTIONS + ANCRES)")
     per_terms = st.slider("Termes à générer par page", 40, 120, 80, 10)
     if st.button("Générer les briefs enrichis"):
-        from modules.enrich import enrich_page, export_enriched_csv
-        enriched = enrich_page(analysis, clusters, links_df, per_page_terms=per_terms)
-
-        # Remplir automatiquement la colonne "Note" avec section + ancre
-        if "Note" in enriched.columns and "Ancre candidate" in enriched.columns:
-            enriched["Note"] = enriched.apply(
-                lambda r: f"Intégrer en {r['Section suggérée']} avec ancre « {r['Ancre candidate']} »" if r["Ancre candidate"] else "",
-                axis=1
-            )
-
-        st.dataframe(enriched.head(200))
-        st.download_button(
-            "Télécharger briefs enrichis (CSV)",
-            enriched.to_csv(index=False).encode("utf-8"),
-            "briefs_enriched.csv"
+        from modules.enrich import iter_enriched, export_enriched_csv
+        # Colonne "Note" remplie avec section + ancre pendant la génération
+        enriched_path = export_enriched_csv(
+            iter_enriched(analysis, clusters, links_df, per_page_terms=per_terms, with_notes=True),
+            os.path.join(export_dir, "briefs_enriched.csv"),
+            fmt=export_fmt, chunk_rows=chunk_rows
         )
-        export_enriched_csv(enriched)
-        st.success("Briefs enrichis exportés dans ./exports/briefs_enriched.csv")
+
+        st.dataframe(read_head(enriched_path, 200))
+        _download_export(f"Télécharger briefs enrichis ({export_fmt.upper()})", enriched_path)
+        st.success(f"Briefs enrichis exportés dans ./{enriched_path}")
 
         # --- Onglets PRO (doivent être DANS le if) ---
     tab1, tab2, tab3 = st.tabs(["Briefs PRO", "Cocons (Mots-clés)", "Recherche externe"])
@@ -186,45 +225,68 @@ if st.session_state.docs:
         per_page_terms = st.slider("Nombre de termes par page", 20, 60, 40, 5)
         target_len = st.slider("Longueur de référence (mots)", 800, 2000, 1200, 100)
         if st.button("Générer les Briefs PRO"):
-            from modules.briefs_pro import generate_briefs_pro, export_briefs_pro_csv
-            briefs_pro = generate_briefs_pro(
-                analysis, clusters,
-                target_len_words=target_len,
-                per_page_terms=per_page_terms
-            )
-            st.dataframe(briefs_pro.head(80))
-            st.download_button(
-                "Télécharger briefs PRO (CSV)",
-                briefs_pro.to_csv(index=False).encode("utf-8"),
-                "briefs_pro.csv"
+            from modules.briefs_pro import iter_briefs_pro, export_briefs_pro_csv, export_lexicon
+            missing = []
+            briefs_pro_path = export_briefs_pro_csv(
+                iter_briefs_pro(
+                    analysis, clusters,
+                    target_len_words=target_len,
+                    per_page_terms=per_page_terms,
+                    missing=missing
+                ),
+                os.path.join(export_dir, "briefs_pro.csv"),
+                fmt=export_fmt, chunk_rows=chunk_rows
             )
-            export_briefs_pro_csv(briefs_pro)
-            st.success("Briefs PRO exportés dans ./exports/briefs_pro.csv")
+            export_lexicon(analysis, briefs_pro_path)
+            if missing:
+                # lemmes spaCy dépendants du contexte : quelques écarts sont attendus, détail consultable
+                with st.expander(f"Contrôle : {len(missing)} terme(s) non retrouvé(s) dans leur propre page"):
+                    st.dataframe(pd.DataFrame(missing, columns=["URL", "Terme"]))
+            st.dataframe(read_head(briefs_pro_path, 80))
+            _download_export(f"Télécharger briefs PRO ({export_fmt.upper()})", briefs_pro_path)
+            st.success(f"Briefs PRO exportés dans ./{briefs_pro_path}")
 
     with tab2:
         st.markdown("### Générateur de cocons à partir d'une liste de mots-clés")
         kws_text = st.text_area("Colle une liste de mots-clés (un par ligne)", height=200)
+        kws_file = st.file_uploader("… ou importe un export CSV de mots-clés", type=["csv"])
+        from modules.keywords import keywords_large_cfg
+        large_cfg = keywords_large_cfg(cfg)
         n_clusters = st.number_input(
             "Nombre de clusters (laisser 0 pour auto)",
-            min_value=0, max_value=50, value=0, step=1
+            min_value=0, max_value=50, value=0, step=1,
+            help=(f"Ignoré au-delà de {large_cfg['threshold']} mots-clés : la méthode 'graph' déduit le nombre de clusters"
+                  if large_cfg["method"] == "graph" else None)
         )
         if st.button("Clusteriser les mots-clés"):
-            from modules.keywords import cluster_keywords, export_cocons_to_csv
+            from modules.keywords import cluster_keywords, export_cocons_to_csv, cluster_keywords_large, read_keywords_csv
             kws = [k.strip() for k in kws_text.splitlines() if k.strip()]
-            if kws:
+            if kws_file is not None:
+                kws += list(read_keywords_csv(kws_file))
+            if len(kws) > int(large_cfg["threshold"]):
+                # Mode grande échelle : encodage par chunks, embeddings sur disque, export en flux
+                with st.spinner(f"Clustering de {len(kws)} mots-clés ({large_cfg['method']})…"):
+                    res = cluster_keywords_large(
+                        kws, cfg, os.path.join(export_dir, "cocons_keywords.csv"),
+                        n_clusters=n_clusters if n_clusters > 0 else None,
+                        fmt=export_fmt
+                    )
+                if res["warning"]:
+                    st.warning(res["warning"])
+                st.dataframe(read_head(res["path"], 100))
+                _download_export(f"Télécharger cocons ({export_fmt.upper()})", res["path"])
+                st.success(f"{res['clusters']} cocons exportés dans ./{res['path']}")
+            elif kws:
                 cocons_df = cluster_keywords(
                     kws,
                     n_clusters if n_clusters > 0 else None,
-                    model_name=cfg["similarity"]["model_name"]
+                    model_name=cfg["similarity"]["model_name"],
+                    embeddings=cfg.get("embeddings")
                 )
                 st.dataframe(cocons_df.head(100))
-                st.download_button(
-                    "Télécharger cocons (CSV)",
-                    cocons_df.to_csv(index=False).encode("utf-8"),
-                    "cocons_keywords.csv"
-                )
-                export_cocons_to_csv(cocons_df)
-                st.success("Cocons exportés dans ./exports/cocons_keywords.csv")
+                cocons_path = export_cocons_to_csv(cocons_df, os.path.join(export_dir, "cocons_keywords.csv"), fmt=export_fmt, chunk_rows=chunk_rows)
+                _download_export(f"Télécharger cocons ({export_fmt.upper()})", cocons_path)
+                st.success(f"Cocons exportés dans ./{cocons_path}")
             else:
                 st.warning("Ajoute au moins un mot-clé.")
 
@@ -0,0 +1,92 @@
+from typing import Dict, Any, List
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+def page_clusters(analysis: Dict[str, Any], clusters_df) -> np.ndarray:
+    # Cluster de chaque page (ordre de analysis["pages"]), -1 si absente : une seule jointure
+    urls = pd.Series([p["url"] for p in analysis["pages"]])
+    if clusters_df is None or clusters_df.empty:
+        return np.full(len(urls), -1, dtype=np.int64)
+    by_url = pd.Series(clusters_df["cluster"].to_numpy(), index=clusters_df["url"].to_numpy())
+    by_url = by_url[~by_url.index.duplicated()]
+    return urls.map(by_url).fillna(-1).to_numpy(dtype=np.int64)
+
+def _pairs_matrix(per_page: List[List[tuple]], weighted: bool):
+    # Matrice pages × vocabulaire à partir de listes [(terme, poids|label), ...]
+    vocab: Dict[str, int] = {}
+    rows, cols, vals = [], [], []
+    for i, items in enumerate(per_page):
+        for term, w in items:
+            j = vocab.setdefault(term, len(vocab))
+            rows.append(i)
+            cols.append(j)
+            vals.append(float(w) if weighted else 1.0)
+    names = np.array(list(vocab), dtype=object)
+    mat = sparse.csr_matrix((vals, (rows, cols)), shape=(len(per_page), len(vocab)), dtype=np.float64)
+    mat.sum_duplicates()
+    return mat, names
+
+def build_cluster_aggregates(analysis: Dict[str, Any], clusters_df) -> Dict[str, Any]:
+    labels = page_clusters(analysis, clusters_df)
+    ids = np.unique(labels[labels >= 0])
+    member = np.flatnonzero(labels >= 0)
+    # Indicatrice clusters × pages, construite une fois
+    M = sparse.csr_matrix(
+        (np.ones(len(member)), (np.searchsorted(ids, labels[member]), member)),
+        shape=(len(ids), len(labels)),
+    )
+    sizes = np.asarray(M.sum(axis=1)).ravel()
+    mean_op = sparse.diags(1.0 / np.maximum(sizes, 1)) @ M
+
+    centroids = (mean_op @ analysis["tfidf_X"]).tocsr()
+
+    # c-TF-IDF : tf par cluster × log(1 + A / f_t)
+    counts = (M @ analysis["counts_X"]).tocsr().astype(np.float64)
+    words = np.asarray(counts.sum(axis=1)).ravel()
+    tf = sparse.diags(1.0 / np.maximum(words, 1)) @ counts
+    avg_words = words.sum() / max(1, len(ids))
+    freq = np.asarray(counts.sum(axis=0)).ravel()
+    idf = np.log1p(avg_words / np.maximum(freq, 1))
+    ctfidf = (tf @ sparse.diags(idf)).tocsr()
+
+    ents, ent_names = _pairs_matrix(analysis["ents"], weighted=False)
+    ngrams, ngram_names = _pairs_matrix(analysis["top_ngrams"], weighted=True)
+
+    return {
+        "cluster_ids": ids,
+        "page_cluster": labels,
+        "indicator": M,
+        "sizes": sizes.astype(np.int64),
+        "centroids": centroids,
+        "ctfidf": ctfidf,
+        "vocab": np.asarray(analysis["vocab"], dtype=object),
+        "entity_counts": (M @ ents).tocsr(),
+        "entity_names": ent_names,
+        "ngram_counts": (M @ ngrams).tocsr(),
+        "ngram_names": ngram_names,
+    }
+
+def top_of_row(mat, i: int, names, topn: int = 10) -> List[str]:
+    # Top-n d'une ligne CSR sans densifier ni trier tout le vocabulaire
+    start, end = mat.indptr[i], mat.indptr[i + 1]
+    data, idx = mat.data[start:end], mat.indices[start:end]
+    if len(data) > topn:
+        part = np.argpartition(-data, topn)[:topn]
+    else:
+        part = np.arange(len(data))
+    order = part[np.argsort(-data[part], kind="stable")]
+    return [names[idx[j]] for j in order if data[j] > 0]
+
+def cluster_descriptors(agg: Dict[str, Any], topn: int = 10) -> pd.DataFrame:
+    rows = []
+    for i, c_id in enumerate(agg["cluster_ids"]):
+        rows.append({
+            "cluster": int(c_id),
+            "pages": int(agg["sizes"][i]),
+            "top_terms": ", ".join(top_of_row(agg["centroids"], i, agg["vocab"], topn)),
+            "c_tfidf": ", ".join(top_of_row(agg["ctfidf"], i, agg["vocab"], topn)),
+            "entités": ", ".join(top_of_row(agg["entity_counts"], i, agg["entity_names"], topn)),
+            "ngrams": ", ".join(top_of_row(agg["ngram_counts"], i, agg["ngram_names"], topn)),
+        })
+    return pd.DataFrame(rows)
@@ -1,20 +1,27 @@
 import pandas as pd
 import numpy as np
-import spacy
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from collections import Counter
+from collections import Counter, defaultdict
 import re, itertools, os
+from modules.registry import spacy_model, lazy_import
 
 def load_spacy(model_name):
-    try:
-        return spacy.load(model_name)
-    except OSError:
-        raise RuntimeError(f"Modèle spaCy '{model_name}' non installé. Lance: python -m spacy download {model_name}")
+    # spaCy importé et modèle chargé une seule fois par process (voir modules.registry)
+    return spacy_model(model_name)
 
-def tokenize_lemma(nlp, text):
+def lexicon_key(text):
+    # forme de surface telle que la voit le tokenizer des brouillons (élision "l'" -> "l")
+    return re.sub(r"['’]+$", "", text.lower())
+
+def tokenize_lemma(nlp, text, lexicon=None):
     doc = nlp(text)
-    toks = [t.lemma_.lower() for t in doc if not (t.is_stop or t.is_punct or t.like_num or t.is_space)]
+    toks = []
+    for t in doc:
+        keep = not (t.is_stop or t.is_punct or t.like_num or t.is_space)
+        if keep:
+            toks.append(t.lemma_.lower())
+        if lexicon is not None and not t.is_space:
+            # forme -> lemme ("" si filtré) : permet de normaliser les brouillons sans spaCy
+            lexicon[lexicon_key(t.text)][t.lemma_.lower() if keep else ""] += 1
     return toks
 
 def extract_ents(nlp, text):
@@ -29,17 +36,22 @@ def analyze_corpus(docs, cfg):
     nlp = load_spacy(cfg["nlp"]["spacy_model"])
     pages = []
     all_tokens = []
+    lexicon = defaultdict(Counter)
 
     for d in docs:
-        toks = tokenize_lemma(nlp, d["text"])
+        toks = tokenize_lemma(nlp, d["text"], lexicon)
         pages.append({"url": d["url"], "title": d.get("title",""), "tokens": toks, "text": d["text"]})
         all_tokens.append(toks)
 
     # TF-IDF
     texts = [" ".join(p["tokens"]) for p in pages]
-    tfidf_vec = TfidfVectorizer(max_features=cfg["nlp"]["max_features_tfidf"], ngram_range=tuple(cfg["nlp"]["ngram_range"]))
+    text_mod = lazy_import("sklearn.feature_extraction.text")
+    tfidf_vec = text_mod.TfidfVectorizer(max_features=cfg["nlp"]["max_features_tfidf"], ngram_range=tuple(cfg["nlp"]["ngram_range"]))
     X = tfidf_vec.fit_transform(texts)
     vocab = tfidf_vec.get_feature_names_out()
+    # Comptes bruts sur le même vocabulaire (c-TF-IDF des clusters), publiés en mmap avec le TF-IDF
+    count_vec = text_mod.CountVectorizer(vocabulary=tfidf_vec.vocabulary_, ngram_range=tfidf_vec.ngram_range)
+    counts_X = count_vec.transform(texts)
 
     # Cooccurrences (bigrams/trigrams)
     top_ngrams = []
@@ -58,8 +70,14 @@ def analyze_corpus(docs, cfg):
         "pages": pages,
         "pages_df": pages_df,
         "tfidf_vec": tfidf_vec,
+        "count_vec": count_vec,
         "tfidf_X": X,
+        "counts_X": counts_X,
         "vocab": vocab,
         "top_ngrams": top_ngrams,
         "ents": ents_per_page,
+        "lexicon": {
+            "lemmas": {k: c.most_common(1)[0][0] for k, c in lexicon.items()},
+            "stop_words": sorted(nlp.Defaults.stop_words),
+        },
     }
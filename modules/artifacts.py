@@ -0,0 +1,150 @@
+import hashlib, json, os, re, shutil, tempfile
+from typing import Dict, Any, Iterable, List, Tuple
+from urllib.parse import urlparse
+import numpy as np
+from scipy import sparse
+
+# Artefacts numériques volumineux (embeddings, TF-IDF CSR, similarités, voisins) écrits en .npy
+# puis rouverts en mmap lecture seule : sessions Streamlit et workers partagent les pages de l'OS.
+
+SHARED_MODE = 0o644  # mkstemp crée en 0600 : workers sous un autre utilisateur doivent pouvoir lire
+_SITE_RE = re.compile(r"^(?P<prefix>.+)-[0-9a-f]{12}$")
+
+def site_dir(urls: List[str], cfg: dict, root: str = "artifacts", arrays: Iterable[np.ndarray] = ()) -> str:
+    # Un dossier par site : URLs dans l'ordre des pages + config + empreinte des données
+    # (un autre ordre ou un contenu modifié donne un autre dossier, jamais des lignes décalées)
+    h = hashlib.sha1()
+    for u in urls:
+        h.update(u.encode("utf-8"))
+        h.update(b"\n")
+    h.update(json.dumps(cfg, sort_keys=True, default=str).encode("utf-8"))
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        h.update(str((arr.dtype.str, arr.shape)).encode("utf-8"))
+        h.update(arr.data)
+    domain = urlparse(urls[0]).netloc.replace(":", "_") if urls else "site"
+    return os.path.join(root, f"{domain}-{h.hexdigest()[:12]}")
+
+def _path(site: str, name: str) -> str:
+    return os.path.join(site, name + ".npy")
+
+def save_array(site: str, name: str, arr: np.ndarray) -> str:
+    os.makedirs(site, exist_ok=True)
+    path = _path(site, name)
+    # fichier temporaire unique par écrivain (sessions concurrentes sur le même site)
+    fd, tmp = tempfile.mkstemp(dir=site, prefix=name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            np.save(fh, np.ascontiguousarray(arr))
+        os.chmod(tmp, SHARED_MODE)
+        # remplacement atomique : les lecteurs déjà ouverts gardent l'ancien fichier
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+def open_array(site: str, name: str) -> np.ndarray:
+    return np.load(_path(site, name), mmap_mode="r")
+
+def has_array(site: str, name: str) -> bool:
+    return os.path.exists(_path(site, name))
+
+def save_csr(site: str, name: str, X) -> None:
+    X = sparse.csr_matrix(X)
+    save_array(site, f"{name}.data", X.data)
+    save_array(site, f"{name}.indices", X.indices)
+    save_array(site, f"{name}.indptr", X.indptr)
+    save_array(site, f"{name}.shape", np.asarray(X.shape, dtype=np.int64))
+
+def open_csr(site: str, name: str):
+    shape = tuple(int(v) for v in np.load(_path(site, f"{name}.shape")))
+    return sparse.csr_matrix(
+        (open_array(site, f"{name}.data"), open_array(site, f"{name}.indices"), open_array(site, f"{name}.indptr")),
+        shape=shape, copy=False,
+    )
+
+def has_csr(site: str, name: str) -> bool:
+    return all(has_array(site, f"{name}.{part}") for part in ("data", "indices", "indptr", "shape"))
+
+def top_neighbors(sim: np.ndarray, k: int = 20, chunk_rows: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    # k plus proches voisins par ligne (hors soi-même), traités par blocs de lignes
+    n = sim.shape[0]
+    k = max(0, min(k, n - 1))
+    idx = np.empty((n, k), dtype=np.int32)
+    val = np.empty((n, k), dtype=np.float32)
+    for start in range(0, n, chunk_rows):
+        block = np.array(sim[start:start + chunk_rows], dtype=np.float32)
+        rows = np.arange(block.shape[0])
+        block[rows, start + rows] = -np.inf
+        if k == 0:
+            continue
+        part = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        part_val = np.take_along_axis(block, part, axis=1)
+        order = np.argsort(-part_val, axis=1, kind="stable")
+        idx[start:start + block.shape[0]] = np.take_along_axis(part, order, axis=1)
+        val[start:start + block.shape[0]] = np.take_along_axis(part_val, order, axis=1)
+    return idx, val
+
+def digest_arrays(analysis: Dict[str, Any], sim: np.ndarray) -> List[np.ndarray]:
+    # Empreinte pour site_dir : structure + valeurs TF-IDF et forme des similarités
+    X = sparse.csr_matrix(analysis["tfidf_X"])
+    return [X.indptr, X.indices, X.data, np.asarray(sim.shape, dtype=np.int64)]
+
+def prune_sites(site: str, keep: int = 3) -> int:
+    # Éviction : garde les `keep` dossiers les plus récents du même domaine (site inclus), supprime les autres
+    root, name = os.path.split(os.path.normpath(site))
+    m = _SITE_RE.match(name)
+    if keep <= 0 or m is None or not os.path.isdir(root):
+        return 0
+    others = []
+    for entry in os.scandir(root):
+        em = _SITE_RE.match(entry.name)
+        if entry.name != name and em and em.group("prefix") == m.group("prefix") and entry.is_dir(follow_symlinks=False):
+            try:
+                others.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+    others.sort(reverse=True)
+    # les mmaps déjà ouverts restent valides après suppression (inode conservé jusqu'à fermeture)
+    for _, path in others[keep - 1:]:
+        shutil.rmtree(path, ignore_errors=True)
+    return max(0, len(others) - (keep - 1))
+
+def _array_ok(site: str, name: str, shape: tuple) -> bool:
+    return has_array(site, name) and open_array(site, name).shape == tuple(shape)
+
+def _csr_ok(site: str, name: str, X) -> bool:
+    if not has_csr(site, name):
+        return False
+    Y = open_csr(site, name)
+    return Y.shape == X.shape and Y.nnz == X.nnz
+
+def publish(site: str, analysis: Dict[str, Any], sim: np.ndarray, emb: np.ndarray = None, k: int = 20, keep: int = 3) -> Dict[str, Any]:
+    # Écrit les artefacts absents ou de forme incohérente, puis renvoie des vues mmap lecture seule ;
+    # seuls les `keep` derniers dossiers du domaine sont conservés
+    n = sim.shape[0]
+    k_eff = max(0, min(k, n - 1))
+    if not _csr_ok(site, "tfidf", analysis["tfidf_X"]):
+        save_csr(site, "tfidf", analysis["tfidf_X"])
+    if analysis.get("counts_X") is not None and not _csr_ok(site, "counts", analysis["counts_X"]):
+        save_csr(site, "counts", analysis["counts_X"])
+    if not _array_ok(site, "sim", sim.shape):
+        save_array(site, "sim", sim)
+    if emb is not None and not _array_ok(site, "embeddings", emb.shape):
+        save_array(site, "embeddings", emb)
+    if not (_array_ok(site, "neighbors_idx", (n, k_eff)) and _array_ok(site, "neighbors_sim", (n, k_eff))):
+        idx, val = top_neighbors(sim, k)
+        save_array(site, "neighbors_sim", val)
+        save_array(site, "neighbors_idx", idx)
+    os.utime(site)  # réutilisé = récent pour l'éviction
+    prune_sites(site, keep)
+    return {
+        "tfidf_X": open_csr(site, "tfidf"),
+        "counts_X": open_csr(site, "counts") if has_csr(site, "counts") else None,
+        "sim": open_array(site, "sim"),
+        "embeddings": open_array(site, "embeddings") if has_array(site, "embeddings") else None,
+        "neighbors_idx": open_array(site, "neighbors_idx"),
+        "neighbors_sim": open_array(site, "neighbors_sim"),
+    }
@@ -1,9 +1,12 @@
 import pandas as pd
 import numpy as np
 from collections import Counter
-import os
+from modules.exports import write_table
 
-def generate_briefs(analysis, clusters_df, cfg):
+# Colonnes de l'export (schéma d'un export vide)
+COLUMNS = ["URL", "Titre", "Terme", "Priorité", "Type", "Section suggérée", "Ancre interne candidate", "Note d’intégration"]
+
+def iter_briefs(analysis, clusters_df, cfg):
     pages = analysis["pages"]
     vocab = analysis["vocab"]
     X = analysis["tfidf_X"]
@@ -15,7 +18,6 @@ def generate_briefs(analysis, clusters_df, cfg):
     sec = int(per_page_terms*cfg["briefs"]["secondary_ratio"])
     opp = per_page_terms - ess - sec
 
-    rows = []
     for i,p in enumerate(pages):
         # Top TF-IDF features pour la page i
         vec = X[i].toarray().ravel()
@@ -41,9 +43,9 @@ def generate_briefs(analysis, clusters_df, cfg):
         secondaries = fused[ess:ess+sec]
         opportunities = fused[ess+sec:ess+sec+opp]
 
-        def add_rows(terms, prio):
+        def page_rows(terms, prio):
             for t in terms:
-                rows.append({
+                yield {
                     "URL": p["url"],
                     "Titre": p.get("title",""),
                     "Terme": t,
@@ -52,14 +54,15 @@ def generate_briefs(analysis, clusters_df, cfg):
                     "Section suggérée": "H2/H3",
                     "Ancre interne candidate": "",
                     "Note d’intégration": ""
-                })
+                }
 
-        add_rows(essentials, 1)
-        add_rows(secondaries, 2)
-        add_rows(opportunities, 3)
+        yield from page_rows(essentials, 1)
+        yield from page_rows(secondaries, 2)
+        yield from page_rows(opportunities, 3)
 
-    return pd.DataFrame(rows)
+def generate_briefs(analysis, clusters_df, cfg):
+    return pd.DataFrame(list(iter_briefs(analysis, clusters_df, cfg)))
 
-def export_briefs_csv(df: pd.DataFrame, path="exports/briefs_lexicaux.csv"):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    df.to_csv(path, index=False)
+def export_briefs_csv(df, path="exports/briefs_lexicaux.csv", fmt="csv", chunk_rows=5000):
+    # df : DataFrame ou générateur de lignes (iter_briefs) ; renvoie le chemin écrit
+    return write_table(df, path, fmt, chunk_rows, columns=COLUMNS)
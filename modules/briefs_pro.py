@@ -1,12 +1,13 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterable, Iterator, Callable, Tuple
 import pandas as pd
 import numpy as np
 from collections import Counter
-import re
+import re, os, json
+from modules.exports import write_table
+from modules.aggregates import page_clusters
 
-def tokenize(text: str) -> List[str]:
-    toks = re.findall(r"[a-zàâäéèêëïîìôöùûüç\-']{2,}", text.lower())
-    return toks
+# Colonnes de l'export (schéma d'un export vide)
+COLUMNS = ["URL", "Titre", "Cluster", "Priorité", "Terme", "Cible (min/1000 mots)", "Cible (max/1000 mots)", "Section suggérée", "Note"]
 
 def term_targets_from_tfidf(tfidf_vec, tfidf_X_row, vocab, per_page_terms=40, target_len_words=1200):
     vec = tfidf_X_row.toarray().ravel()
@@ -25,41 +26,175 @@ def term_targets_from_tfidf(tfidf_vec, tfidf_X_row, vocab, per_page_terms=40, ta
         targets.append({"terme": t, "poids": round(w,3), "cible_min_1000": mn, "cible_max_1000": mx})
     return targets
 
-def coverage_score(page_text: str, terms: List[str]) -> float:
-    toks = tokenize(page_text)
-    bag = set(toks)
-    hits = sum(1 for t in terms if t in bag)
+# Tokens de mots des brouillons (traits d'union conservés, élisions coupées)
+WORD_RE = re.compile(r"\w+(?:-\w+)*")
+# token_pattern par défaut du vectoriseur TF-IDF (analyze_corpus)
+ANALYZER_RE = re.compile(r"(?u)\b\w\w+\b")
+
+def make_normalizer(lexicon: Dict[str, Any] = None) -> Callable[[str], Tuple[int, List[str]]]:
+    # Normalise un brouillon comme les termes ont été construits : stopwords retirés,
+    # lemme via le lexique du corpus (analysis["lexicon"]), découpe du vectoriseur.
+    # Le résultat par mot est mis en cache : coût amorti sur un flux de brouillons.
+    lemmas = (lexicon or {}).get("lemmas", {})
+    stop = set((lexicon or {}).get("stop_words", ()))
+    cache: Dict[str, Tuple[str, ...]] = {}
+
+    def word(w: str) -> Tuple[str, ...]:
+        out = cache.get(w)
+        if out is None:
+            lem = lemmas.get(w)
+            if lem is None and "-" in w and w not in stop:
+                out = tuple(t for part in w.split("-") for t in word(part))
+            else:
+                if lem is None:
+                    lem = "" if (w in stop or w.isdigit()) else w
+                out = tuple(ANALYZER_RE.findall(lem)) if lem else ()
+            cache[w] = out
+        return out
+
+    def normalize(text: str) -> Tuple[int, List[str]]:
+        words = WORD_RE.findall(text.lower())
+        toks = []
+        for w in words:
+            toks.extend(word(w))
+        return len(words), toks
+
+    return normalize
+
+def compile_brief(targets: List[Dict[str, Any]], normalizer: Callable = None) -> Dict[str, Any]:
+    # Pré-tokenise les termes une seule fois (termes multi-mots = tuples de tokens)
+    terms, index, lengths = [], {}, set()
+    cmin, cmax = [], []
+    for t in targets:
+        key = tuple(ANALYZER_RE.findall(str(t["terme"]).lower()))
+        if not key or key in index:
+            continue
+        index[key] = len(terms)
+        lengths.add(len(key))
+        terms.append(t["terme"])
+        cmin.append(float(t.get("cible_min_1000", 0) or 0))
+        cmax.append(float(t.get("cible_max_1000", 0) or 0))
+    return {
+        "terms": terms,
+        "index": index,
+        "lengths": sorted(lengths),
+        "cible_min": np.array(cmin, dtype=np.float64),
+        "cible_max": np.array(cmax, dtype=np.float64),
+        "normalize": normalizer or make_normalizer(),
+    }
+
+def count_terms(brief: Dict[str, Any], toks: List[str]) -> np.ndarray:
+    counts = np.zeros(len(brief["terms"]), dtype=np.int64)
+    index = brief["index"]
+    for n in brief["lengths"]:
+        # Counter(zip(...)) compte tous les n-grammes en C, puis lookup par terme
+        grams = Counter(zip(*[toks[i:] for i in range(n)]))
+        for key, j in index.items():
+            if len(key) == n:
+                counts[j] = grams.get(key, 0)
+    return counts
+
+def score_draft(brief: Dict[str, Any], text: str) -> Dict[str, Any]:
+    n_words, toks = brief["normalize"](text)
+    counts = count_terms(brief, toks)
+    density = counts * (1000.0 / max(1, n_words))
+    n_terms = max(1, len(brief["terms"]))
+    in_range = (density >= brief["cible_min"]) & (density <= brief["cible_max"])
+    return {
+        "mots": n_words,
+        "occurrences": counts,
+        "densite_1000": density,
+        "couverture": round(100.0 * int((counts > 0).sum()) / n_terms, 1),
+        "conformite": round(100.0 * int(in_range.sum()) / n_terms, 1),
+    }
+
+def score_drafts(brief: Dict[str, Any], texts: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    # Générateur : permet de scorer un flux de brouillons sans tout charger
+    for text in texts:
+        yield score_draft(brief, text)
+
+def term_status(density: float, mn: float, mx: float) -> str:
+    if density == 0:
+        return "absent"
+    if density < mn:
+        return "insuffisant"
+    if density > mx:
+        return "excessif"
+    return "ok"
+
+def draft_report(brief: Dict[str, Any], result: Dict[str, Any]) -> pd.DataFrame:
+    rows = []
+    for j, t in enumerate(brief["terms"]):
+        d = float(result["densite_1000"][j])
+        mn, mx = float(brief["cible_min"][j]), float(brief["cible_max"][j])
+        rows.append({
+            "Terme": t,
+            "Occurrences": int(result["occurrences"][j]),
+            "Densité (/1000 mots)": round(d, 2),
+            "Cible (min/1000 mots)": mn,
+            "Cible (max/1000 mots)": mx,
+            "Statut": term_status(d, mn, mx),
+        })
+    return pd.DataFrame(rows)
+
+def coverage_score(page_text: str, terms: List[str], lexicon: Dict[str, Any] = None) -> float:
+    brief = compile_brief([{"terme": t} for t in terms], make_normalizer(lexicon))
+    _, toks = brief["normalize"](page_text)
+    hits = int((count_terms(brief, toks) > 0).sum())
     return round(100.0 * hits / max(1, len(terms)), 1)
 
-def generate_briefs_pro(analysis: Dict[str, Any], clusters_df, target_len_words: int = 1200, per_page_terms: int = 40) -> pd.DataFrame:
+def lexicon_path(briefs_path: str) -> str:
+    return os.path.splitext(briefs_path)[0] + ".lexique.json"
+
+def export_lexicon(analysis: Dict[str, Any], briefs_path: str) -> str:
+    # Lexique forme -> lemme à côté de l'export, relu par python -m modules.coverage
+    path = lexicon_path(briefs_path)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(analysis.get("lexicon") or {}, fh, ensure_ascii=False)
+    return path
+
+def load_lexicon(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+def iter_briefs_pro(analysis: Dict[str, Any], clusters_df, target_len_words: int = 1200, per_page_terms: int = 40,
+                    missing: List[Dict[str, str]] = None) -> Iterator[Dict[str, Any]]:
+    # missing : si fourni, reçoit {"URL", "Terme"} pour chaque terme que le scoring des brouillons
+    # ne retrouve pas dans sa propre page (contrôle de normalisation, sans second scoring)
     pages = analysis["pages"]
     tfidf_vec = analysis["tfidf_vec"]
     X = analysis["tfidf_X"]
     vocab = analysis["vocab"]
-    rows = []
+    clusters = page_clusters(analysis, clusters_df)
+    normalizer = make_normalizer(analysis.get("lexicon"))
     for i, p in enumerate(pages):
         targets = term_targets_from_tfidf(tfidf_vec, X[i], vocab, per_page_terms, target_len_words)
-        terms = [t["terme"] for t in targets]
-        score = coverage_score(p["text"], terms)
+        brief = compile_brief(targets, normalizer)
+        res = score_draft(brief, p["text"])
+        score = res["couverture"]
+        if missing is not None:
+            missing.extend({"URL": p["url"], "Terme": brief["terms"][j]} for j in np.flatnonzero(res["occurrences"] == 0))
+        cluster = int(clusters[i])
         for rank, t in enumerate(targets, start=1):
-            rows.append({
+            yield {
                 "URL": p["url"],
                 "Titre": p.get("title",""),
-                "Cluster": int(clusters_df.loc[clusters_df["url"]==p["url"], "cluster"].values[0]) if not clusters_df.empty else -1,
+                "Cluster": cluster,
                 "Priorité": 1 if rank <= int(per_page_terms*0.4) else (2 if rank <= int(per_page_terms*0.8) else 3),
                 "Terme": t["terme"],
                 "Cible (min/1000 mots)": t["cible_min_1000"],
                 "Cible (max/1000 mots)": t["cible_max_1000"],
                 "Section suggérée": "Intro/H2/H3/FAQ",
                 "Note": ""
-            })
-        rows.append({
-            "URL": p["url"], "Titre": p.get("title",""), "Cluster": int(clusters_df.loc[clusters_df["url"]==p["url"], "cluster"].values[0]) if not clusters_df.empty else -1,
+            }
+        yield {
+            "URL": p["url"], "Titre": p.get("title",""), "Cluster": cluster,
             "Priorité": "", "Terme": "__SCORE_COUVERTURE__", "Cible (min/1000 mots)": score, "Cible (max/1000 mots)": "", "Section suggérée": "", "Note": "Score de couverture (%) des termes proposés"
-        })
-    return pd.DataFrame(rows)
+        }
+
+def generate_briefs_pro(analysis: Dict[str, Any], clusters_df, target_len_words: int = 1200, per_page_terms: int = 40) -> pd.DataFrame:
+    return pd.DataFrame(list(iter_briefs_pro(analysis, clusters_df, target_len_words, per_page_terms)))
 
-def export_briefs_pro_csv(df: pd.DataFrame, path="exports/briefs_pro.csv"):
-    import os
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    df.to_csv(path, index=False)
+def export_briefs_pro_csv(df, path="exports/briefs_pro.csv", fmt="csv", chunk_rows=5000) -> str:
+    # df : DataFrame ou générateur de lignes (iter_briefs_pro) ; renvoie le chemin écrit
+    return write_table(df, path, fmt, chunk_rows, columns=COLUMNS)
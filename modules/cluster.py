@@ -1,13 +1,15 @@
 import pandas as pd
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.cluster import KMeans
-from sklearn.metrics.pairwise import cosine_similarity
+from modules.embeddings import EmbeddingBackend, dequantize
+from modules.registry import lazy_import
 
-def cluster_pages(analysis, cfg):
+def cluster_pages(analysis, cfg, return_embeddings=False):
+    KMeans = lazy_import("sklearn.cluster").KMeans
+    cosine_similarity = lazy_import("sklearn.metrics.pairwise").cosine_similarity
     texts = [p["text"] for p in analysis["pages"]]
-    model = SentenceTransformer(cfg["similarity"]["model_name"])
-    emb = model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    backend = EmbeddingBackend.from_config(cfg)
+    stored = backend.encode(texts)  # float32 / float16 / int8 selon embeddings.storage_dtype
+    emb = dequantize(stored)
     sim = cosine_similarity(emb)
 
     # Simple KMeans auto (k = sqrt(N) approx, min 2)
@@ -20,4 +22,7 @@ def cluster_pages(analysis, cfg):
         "title": [p["title"] for p in analysis["pages"]],
         "cluster": labels
     })
+    df.attrs["embedding_stats"] = backend.stats
+    if return_embeddings:
+        return df, sim, stored
     return df, sim
@@ -0,0 +1,88 @@
+import argparse, csv, json, os, sys
+from typing import Dict, Any, Iterator, Tuple
+from modules.exports import read_table, latest_export
+from modules.briefs_pro import compile_brief, score_draft, term_status, make_normalizer, lexicon_path, load_lexicon
+
+SCORE_ROW = "__SCORE_COUVERTURE__"
+
+def load_briefs(path: str, lexicon: Dict[str, Any] = None) -> Dict[str, Dict[str, Any]]:
+    # Relit l'export Briefs PRO et compile un brief par URL (normaliseur partagé entre briefs)
+    normalizer = make_normalizer(lexicon)
+    df = read_table(path)  # CSV, Parquet ou Arrow selon l'extension
+    df = df[df["Terme"] != SCORE_ROW]
+    briefs = {}
+    # observed=True : URL peut être une colonne catégorielle (dictionnaire Parquet/Arrow)
+    for url, sub in df.groupby("URL", sort=False, observed=True):
+        targets = [
+            {"terme": t, "cible_min_1000": mn, "cible_max_1000": mx}
+            for t, mn, mx in zip(sub["Terme"], sub["Cible (min/1000 mots)"], sub["Cible (max/1000 mots)"])
+        ]
+        briefs[url] = compile_brief(targets, normalizer)
+    return briefs
+
+def iter_jsonl(fh) -> Iterator[Tuple[str, str, str]]:
+    for n, line in enumerate(fh, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        rec = json.loads(line)
+        yield str(rec.get("id", n)), rec.get("url", ""), rec.get("text", "")
+
+def iter_files(paths, url: str) -> Iterator[Tuple[str, str, str]]:
+    for p in paths:
+        with open(p, encoding="utf-8") as fh:
+            yield p, url, fh.read()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Score de brouillons contre les cibles des Briefs PRO")
+    ap.add_argument("drafts", nargs="*", help="Fichiers texte à scorer (ou --jsonl)")
+    ap.add_argument("--briefs", default=None, help="Export Briefs PRO (.csv, .parquet ou .arrow ; défaut : le plus récent sous exports/<session>/)")
+    ap.add_argument("--url", default="", help="URL du brief à appliquer aux fichiers")
+    ap.add_argument("--jsonl", help="Flux JSONL {id, url, text} ('-' pour stdin)")
+    ap.add_argument("--lexique", default=None, help="Lexique forme -> lemme (défaut : <briefs>.lexique.json)")
+    ap.add_argument("--detail", action="store_true", help="Une ligne par terme au lieu d'une ligne par brouillon")
+    args = ap.parse_args(argv)
+
+    if args.briefs is None:
+        try:
+            args.briefs = latest_export("briefs_pro")
+        except FileNotFoundError as e:
+            ap.error(str(e))
+        print(f"[coverage] briefs : {args.briefs}", file=sys.stderr)
+    lex_path = args.lexique or lexicon_path(args.briefs)
+    lexicon = None
+    if os.path.exists(lex_path):
+        lexicon = load_lexicon(lex_path)
+    else:
+        print(f"[coverage] lexique introuvable ({lex_path}) : brouillons non lemmatisés", file=sys.stderr)
+    briefs = load_briefs(args.briefs, lexicon)
+    if args.jsonl:
+        fh = sys.stdin if args.jsonl == "-" else open(args.jsonl, encoding="utf-8")
+        drafts = iter_jsonl(fh)
+    else:
+        if args.url not in briefs:
+            ap.error(f"URL absente des briefs : {args.url!r}")
+        drafts = iter_files(args.drafts, args.url)
+
+    out = csv.writer(sys.stdout)
+    if args.detail:
+        out.writerow(["id", "url", "terme", "occurrences", "densite_1000", "cible_min_1000", "cible_max_1000", "statut"])
+    else:
+        out.writerow(["id", "url", "mots", "couverture", "conformite"])
+
+    for draft_id, url, text in drafts:
+        brief = briefs.get(url)
+        if brief is None:
+            print(f"[coverage] brief introuvable pour {url!r} ({draft_id})", file=sys.stderr)
+            continue
+        res = score_draft(brief, text)
+        if not args.detail:
+            out.writerow([draft_id, url, res["mots"], res["couverture"], res["conformite"]])
+            continue
+        for j, t in enumerate(brief["terms"]):
+            d = float(res["densite_1000"][j])
+            mn, mx = float(brief["cible_min"][j]), float(brief["cible_max"][j])
+            out.writerow([draft_id, url, t, int(res["occurrences"][j]), round(d, 2), mn, mx, term_status(d, mn, mx)])
+
+if __name__ == "__main__":
+    main()
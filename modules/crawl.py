@@ -1,11 +1,12 @@
 import requests, time, re
 from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import trafilatura
 import readability
 from readability import Document as ReadabilityDoc
 import urllib.robotparser as robotparser
 from .utils import same_domain, clean_text
+from .linkgraph import EdgeCollector, node_key
 
 def can_fetch(url, ua):
     parsed = urlparse(url)
@@ -28,7 +29,7 @@ def extract_readable(url, html):
     except Exception:
         return "", ""
 
-def crawl_from_input(text_input: str, input_mode: str, cfg: dict):
+def crawl_from_input(text_input: str, input_mode: str, cfg: dict, return_graph: bool = False):
     ua = cfg["crawl"]["user_agent"]
     max_pages = cfg["crawl"]["max_pages"]
     max_depth = cfg["crawl"]["max_depth"]
@@ -59,14 +60,16 @@ def crawl_from_input(text_input: str, input_mode: str, cfg: dict):
     seen = set()
     queue = [(s, 0) for s in seeds]
     docs = []
+    edges = EdgeCollector()
 
     base_domain = urlparse(seeds[0]).netloc if seeds else ""
 
     while queue and len(docs) < max_pages:
         url, depth = queue.pop(0)
-        if url in seen: 
+        # variantes d'une même page (slash final, casse de l'hôte, http/https) crawlées une fois
+        if node_key(url) in seen:
             continue
-        seen.add(url)
+        seen.add(node_key(url))
 
         if same_only and base_domain and not same_domain(url, f"https://{base_domain}"):
             continue
@@ -84,15 +87,24 @@ def crawl_from_input(text_input: str, input_mode: str, cfg: dict):
                 continue
 
             docs.append({"url": url, "title": title, "text": clean_text(text)})
-            if depth < max_depth:
-                soup = BeautifulSoup(resp.text, "html.parser")
-                for a in soup.find_all("a", href=True):
-                    href = a["href"]
-                    if href.startswith("#"): 
-                        continue
-                    nxt = urljoin(url, href)
+            # redirections : URL finale et intermédiaires sont des alias de la page crawlée
+            for hop in [r.url for r in resp.history] + [resp.url]:
+                edges.alias(hop, url)
+                seen.add(node_key(hop))
+            # Liens parsés sur toutes les pages (graphe interne), mis en file seulement sous max_depth
+            soup = BeautifulSoup(resp.text, "html.parser", parse_only=SoupStrainer("a", href=True))
+            for a in soup.find_all("a", href=True):
+                href = a["href"]
+                if href.startswith("#"): 
+                    continue
+                nxt = urljoin(resp.url, href)  # base = URL finale après redirection
+                if base_domain and same_domain(nxt, f"https://{base_domain}"):
+                    edges.add(url, nxt)
+                if depth < max_depth:
                     queue.append((nxt, depth+1))
         except Exception:
             continue
 
+    if return_graph:
+        return docs, edges.to_graph([d["url"] for d in docs])
     return docs
@@ -0,0 +1,179 @@
+import argparse, os, sys, time
+from typing import Dict, Any, List, Optional
+import numpy as np
+import pandas as pd
+from modules.registry import get_model, lazy_import
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+STORAGE_DTYPES = ("float32", "float16", "int8")
+DEFAULTS = {
+    "backend": "torch",
+    "storage_dtype": "float32",
+    "token_budget": 8192,
+    "truncate": True,
+    "cache_dir": ".cache/models",
+    "agreement_tolerance": 0.95,
+}
+
+def embeddings_cfg(cfg: dict) -> Dict[str, Any]:
+    out = dict(DEFAULTS)
+    out.update((cfg or {}).get("embeddings", {}) or {})
+    return out
+
+def _load_onnx(model_name: str, quantize: bool, cache_dir: str):
+    SentenceTransformer = lazy_import("sentence_transformers").SentenceTransformer
+    try:
+        if not quantize:
+            return SentenceTransformer(model_name, backend="onnx")
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+    except (TypeError, ImportError):
+        raise RuntimeError("Backend ONNX : nécessite sentence-transformers>=3.2. Lance: pip install \"sentence-transformers[onnx]\"")
+    # export + quantification int8 une seule fois, réutilisés ensuite depuis le cache local
+    local = os.path.join(cache_dir, model_name.replace("/", "__") + "-onnx")
+    qfile = "onnx/model_qint8_avx2.onnx"
+    if not os.path.exists(os.path.join(local, qfile)):
+        model = SentenceTransformer(model_name, backend="onnx")
+        model.save(local)
+        export_dynamic_quantized_onnx_model(model, "avx2", local)
+    return SentenceTransformer(local, backend="onnx", model_kwargs={"file_name": qfile})
+
+def load_model(model_name: str, backend: str = "torch", cache_dir: str = DEFAULTS["cache_dir"]):
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend d'embeddings inconnu : {backend!r} (attendu : {', '.join(BACKENDS)})")
+
+    def load():
+        if backend.startswith("onnx"):
+            return _load_onnx(model_name, backend == "onnx-int8", cache_dir)
+        SentenceTransformer = lazy_import("sentence_transformers").SentenceTransformer
+        model = SentenceTransformer(model_name, device="cpu")
+        if backend == "torch-int8":
+            # quantification dynamique des couches Linear (CPU, sans dépendance supplémentaire)
+            torch = lazy_import("torch")
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+
+    # registre par process : chargé une fois (ou par le préchargement au démarrage)
+    return get_model(("sentence", model_name, backend), load, f"{model_name} ({backend})")
+
+def quantize(emb: np.ndarray, dtype: str = "float32") -> np.ndarray:
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Type de stockage inconnu : {dtype!r} (attendu : {', '.join(STORAGE_DTYPES)})")
+    if dtype == "float16":
+        return emb.astype(np.float16)
+    if dtype == "int8":
+        # embeddings normalisés : composantes dans [-1, 1]
+        return np.clip(np.rint(emb * 127.0), -127, 127).astype(np.int8)
+    return emb.astype(np.float32, copy=False)
+
+def dequantize(emb: np.ndarray) -> np.ndarray:
+    if emb.dtype == np.int8:
+        return emb.astype(np.float32) / 127.0
+    return emb.astype(np.float32, copy=False)
+
+class EmbeddingBackend:
+    def __init__(self, model_name: str, backend: str = "torch", storage_dtype: str = "float32",
+                 token_budget: int = 8192, truncate: bool = True, cache_dir: str = DEFAULTS["cache_dir"]):
+        self.model_name = model_name
+        self.backend = backend
+        self.storage_dtype = storage_dtype
+        self.token_budget = token_budget
+        self.truncate = truncate
+        self.cache_dir = cache_dir
+        self.stats: Dict[str, Any] = {}
+
+    @classmethod
+    def from_config(cls, cfg: dict, **overrides):
+        e = embeddings_cfg(cfg)
+        e.update(overrides)
+        return cls(cfg["similarity"]["model_name"], e["backend"], e["storage_dtype"],
+                   int(e["token_budget"]), bool(e["truncate"]), e["cache_dir"])
+
+    @property
+    def model(self):
+        return load_model(self.model_name, self.backend, self.cache_dir)
+
+    def _buckets(self, lengths: np.ndarray, max_tokens: int) -> List[np.ndarray]:
+        # Tri par longueur puis batchs à budget de tokens constant : moins de padding,
+        # batchs plus gros pour les textes courts
+        order = np.argsort(lengths, kind="stable")
+        est = np.minimum(max_tokens, lengths[order] // 4 + 2)
+        buckets, start = [], 0
+        while start < len(order):
+            end = start + 1
+            while end < len(order) and (end - start + 1) * est[end] <= self.token_budget:
+                end += 1
+            buckets.append(order[start:end])
+            start = end
+        return buckets
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        model = self.model
+        t0 = time.perf_counter()
+        max_tokens = int(getattr(model, "max_seq_length", 512) or 512)
+        if self.truncate:
+            # au-delà de max_seq_length les tokens sont ignorés : inutile de tokeniser tout le texte
+            max_chars = max_tokens * 8
+            texts = [t[:max_chars] for t in texts]
+        lengths = np.array([len(t) for t in texts], dtype=np.int64)
+        dim = model.get_sentence_embedding_dimension()
+        out = np.empty((len(texts), dim), dtype=np.float32)
+        buckets = self._buckets(lengths, max_tokens)
+        for b in buckets:
+            out[b] = model.encode([texts[i] for i in b], batch_size=len(b), normalize_embeddings=True,
+                                  convert_to_numpy=True, show_progress_bar=False)
+        elapsed = time.perf_counter() - t0
+        self.stats = {
+            "backend": self.backend,
+            "storage_dtype": self.storage_dtype,
+            "texts": len(texts),
+            "batches": len(buckets),
+            "seconds": round(elapsed, 3),
+            "texts_per_sec": round(len(texts) / elapsed, 1) if elapsed > 0 else float("inf"),
+        }
+        return quantize(out, self.storage_dtype)
+
+def _labels(emb: np.ndarray, n_clusters: int) -> np.ndarray:
+    KMeans = lazy_import("sklearn.cluster").KMeans
+    return KMeans(n_clusters=n_clusters, n_init="auto", random_state=42).fit_predict(dequantize(emb))
+
+def benchmark(texts: List[str], cfg: dict, backends=BACKENDS, dtypes=STORAGE_DTYPES) -> pd.DataFrame:
+    # Débit de chaque variante + accord de clustering (ARI) vs torch/float32
+    adjusted_rand_score = lazy_import("sklearn.metrics").adjusted_rand_score
+    tol = float(embeddings_cfg(cfg)["agreement_tolerance"])
+    n_clusters = max(2, int(len(texts) ** 0.5))
+    ref = EmbeddingBackend.from_config(cfg, backend="torch", storage_dtype="float32")
+    ref_labels = _labels(ref.encode(texts), n_clusters)
+    rows = []
+    for backend in backends:
+        for dtype in dtypes:
+            be = EmbeddingBackend.from_config(cfg, backend=backend, storage_dtype=dtype)
+            try:
+                emb = be.encode(texts)
+            except Exception as e:
+                rows.append({"backend": backend, "storage_dtype": dtype, "erreur": str(e)})
+                continue
+            ari = adjusted_rand_score(ref_labels, _labels(emb, n_clusters))
+            rows.append({
+                **be.stats,
+                "octets_par_embedding": emb.itemsize * emb.shape[1],
+                "ari_vs_reference": round(float(ari), 4),
+                "dans_tolerance": bool(ari >= tol),
+                "erreur": "",
+            })
+    return pd.DataFrame(rows)
+
+def main(argv: Optional[List[str]] = None):
+    import yaml
+    ap = argparse.ArgumentParser(description="Benchmark des backends d'embeddings (textes/s + accord des clusters)")
+    ap.add_argument("corpus", help="Fichier texte, un document par ligne")
+    ap.add_argument("--config", default="config.yaml")
+    args = ap.parse_args(argv)
+    with open(args.config, encoding="utf-8") as fh:
+        cfg = yaml.safe_load(fh)
+    with open(args.corpus, encoding="utf-8") as fh:
+        texts = [l.strip() for l in fh if l.strip()]
+    df = benchmark(texts, cfg)
+    df.to_csv(sys.stdout, index=False)
+
+if __name__ == "__main__":
+    main()
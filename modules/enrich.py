@@ -1,7 +1,12 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator
 import pandas as pd
 import re
 from collections import Counter
+from modules.exports import write_table
+from modules.aggregates import page_clusters
+
+# Colonnes de l'export (schéma d'un export vide)
+COLUMNS = ["URL", "Titre", "Cluster", "Priorité", "Type", "Terme/Expression", "Section suggérée", "Ancre candidate", "Note"]
 
 SECTION_MAP = [
     ("Intro", ["définition","introduction","présentation","pourquoi"]),
@@ -35,18 +40,21 @@ def guess_section(term: str) -> str:
         return "H2: FAQ"
     return "H2: Méthode/Techniques"
 
-def enrich_page(analysis: Dict[str, Any], clusters_df, links_df: pd.DataFrame, per_page_terms: int = 60) -> pd.DataFrame:
+def integration_note(section: str, anchor: str) -> str:
+    return f"Intégrer en {section} avec ancre « {anchor} »" if anchor else ""
+
+def iter_enriched(analysis: Dict[str, Any], clusters_df, links_df: pd.DataFrame, per_page_terms: int = 60, with_notes: bool = False) -> Iterator[Dict[str, Any]]:
     pages = analysis["pages"]
     vocab = analysis["vocab"]
     X = analysis["tfidf_X"]
     ents = analysis["ents"]
     ngrams = analysis["top_ngrams"]
+    clusters = page_clusters(analysis, clusters_df)
 
-    rows = []
     for i, p in enumerate(pages):
         url = p["url"]
         title = p.get("title","")
-        cluster = int(clusters_df.loc[clusters_df["url"]==url, "cluster"].values[0]) if not clusters_df.empty else -1
+        cluster = int(clusters[i])
 
         vec = X[i].toarray().ravel()
         idx = vec.argsort()[::-1][:per_page_terms]
@@ -89,22 +97,24 @@ def enrich_page(analysis: Dict[str, Any], clusters_df, links_df: pd.DataFrame, p
         rank = 1
         for typ, terms in buckets:
             for t in terms:
-                rows.append({
+                section = guess_section(t)
+                anchor = anchors[rank % len(anchors)] if anchors else ""
+                yield {
                     "URL": url,
                     "Titre": title,
                     "Cluster": cluster,
                     "Priorité": 1 if rank <= int(per_page_terms*0.4) else (2 if rank <= int(per_page_terms*0.8) else 3),
                     "Type": typ,
                     "Terme/Expression": t,
-                    "Section suggérée": guess_section(t),
-                    "Ancre candidate": anchors[rank % len(anchors)] if anchors else "",
-                    "Note": ""
-                })
+                    "Section suggérée": section,
+                    "Ancre candidate": anchor,
+                    "Note": integration_note(section, anchor) if with_notes else ""
+                }
                 rank += 1
 
-    return pd.DataFrame(rows)
+def enrich_page(analysis: Dict[str, Any], clusters_df, links_df: pd.DataFrame, per_page_terms: int = 60, with_notes: bool = False) -> pd.DataFrame:
+    return pd.DataFrame(list(iter_enriched(analysis, clusters_df, links_df, per_page_terms, with_notes)))
 
-def export_enriched_csv(df: pd.DataFrame, path="exports/briefs_enriched.csv"):
-    import os
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    df.to_csv(path, index=False)
+def export_enriched_csv(df, path="exports/briefs_enriched.csv", fmt="csv", chunk_rows=5000) -> str:
+    # df : DataFrame ou générateur de lignes (iter_enriched) ; renvoie le chemin écrit
+    return write_table(df, path, fmt, chunk_rows, columns=COLUMNS)
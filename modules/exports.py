@@ -0,0 +1,224 @@
+import glob, os, shutil, tempfile, time, uuid
+from itertools import islice, chain
+from typing import Iterable, Iterator, Union, Dict, Any, List, Optional
+import pandas as pd
+
+# Colonnes à forte répétition : encodées en dictionnaire (Parquet / Arrow)
+DICT_COLS = ("URL", "Titre", "Type", "Section suggérée", "url", "title", "source_url", "target_url", "target_title")
+
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        return pa, pc
+    except ImportError:
+        raise RuntimeError("Export Parquet/Arrow : pyarrow non installé. Lance: pip install pyarrow")
+
+def with_format(path: str, fmt: str) -> str:
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Format d'export inconnu : {fmt!r} (attendu : {', '.join(EXTENSIONS)})")
+    return os.path.splitext(path)[0] + EXTENSIONS[fmt]
+
+class CsvWriter:
+    def __init__(self, path: str, columns: Optional[List[str]] = None):
+        self.path = path
+        self.columns = columns
+        self.header = True
+
+    def write(self, df: pd.DataFrame):
+        df.to_csv(self.path, index=False, mode="w" if self.header else "a", header=self.header)
+        self.header = False
+
+    def discard(self):
+        pass
+
+    def close(self):
+        if self.header:  # aucun chunk : en-tête seul si les colonnes sont connues, sinon fichier vide
+            pd.DataFrame(columns=self.columns or []).to_csv(self.path, index=False)
+
+class _ArrowBase:
+    def __init__(self, path: str, columns: Optional[List[str]] = None, dict_cols=DICT_COLS):
+        self.pa, self.pc = _pyarrow()
+        self.path = path
+        self.columns = columns
+        self.dict_cols = set(dict_cols)
+        self.schema = None
+        self.writer = None
+
+    def _to_table(self, df: pd.DataFrame):
+        pa, pc = self.pa, self.pc
+        df = df.copy()
+        for c in df.columns:
+            # colonnes object hétérogènes (ex. Priorité = 1 / "") : même rendu texte qu'en CSV
+            if df[c].dtype == object:
+                df[c] = df[c].astype("string")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        for i, name in enumerate(table.column_names):
+            if name in self.dict_cols and pa.types.is_string(table.schema.field(i).type):
+                table = table.set_column(i, name, pc.dictionary_encode(table.column(i)))
+        if self.schema is None:
+            self.schema = table.schema.remove_metadata()
+        # les chunks suivants sont alignés sur le schéma du premier
+        return table.cast(self.schema)
+
+    def write(self, df: pd.DataFrame):
+        table = self._to_table(df)
+        if self.writer is None:
+            self.writer = self._open(table.schema)
+        self.writer.write_table(table)
+
+    def discard(self):
+        # échec en cours d'écriture : ferme le writer sans publier de table vide
+        if self.writer is not None:
+            self.writer.close()
+
+    def close(self):
+        if self.writer is None:
+            # aucune ligne : table vide avec schéma plutôt qu'un fichier de 0 octet illisible
+            if self.schema is None and self.columns:
+                self.schema = self.pa.schema([(c, self.pa.string()) for c in self.columns])
+            if self.schema is None:
+                raise ValueError("Export Parquet/Arrow vide sans colonnes connues : passe columns= à write_table")
+            self.writer = self._open(self.schema)
+        self.writer.close()
+
+class ParquetWriter(_ArrowBase):
+    def _open(self, schema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.path, schema, compression="zstd")
+
+class ArrowWriter(_ArrowBase):
+    def _open(self, schema):
+        # format stream : autorise un dictionnaire différent par chunk
+        return self.pa.ipc.new_stream(self.path, schema)
+
+WRITERS = {"csv": CsvWriter, "parquet": ParquetWriter, "arrow": ArrowWriter}
+
+def iter_chunks(data: Union[pd.DataFrame, Iterable[Dict[str, Any]], Iterable[pd.DataFrame]], chunk_rows: int = 5000) -> Iterator[pd.DataFrame]:
+    if isinstance(data, pd.DataFrame):
+        if data.empty:  # un chunk vide pour transmettre les colonnes (en-tête CSV, schéma Parquet/Arrow)
+            yield data
+        for start in range(0, len(data), chunk_rows):
+            yield data.iloc[start:start + chunk_rows]
+        return
+    rows = iter(data)
+    first = next(rows, None)
+    if first is None:
+        return
+    if isinstance(first, pd.DataFrame):
+        # générateur de DataFrames déjà découpés
+        yield first
+        yield from rows
+        return
+    rows = chain([first], rows)
+    while True:
+        batch = list(islice(rows, chunk_rows))
+        if not batch:
+            break
+        yield pd.DataFrame(batch)
+
+def write_table(data: Union[pd.DataFrame, Iterable[Dict[str, Any]], Iterable[pd.DataFrame]], path: str, fmt: str = "csv",
+                chunk_rows: int = 5000, columns: Optional[List[str]] = None) -> str:
+    # Écrit un DataFrame, un générateur de lignes ou de DataFrames chunk par chunk ; renvoie le chemin écrit.
+    # columns : schéma de repli si le générateur ne produit aucune ligne (sinon ValueError en Parquet/Arrow)
+    path = with_format(path, fmt)
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    # fichier temporaire unique puis remplacement atomique : un téléchargement
+    # concurrent ne lit jamais un fichier à moitié écrit
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        writer = WRITERS[fmt](tmp, columns)
+        try:
+            for chunk in iter_chunks(data, chunk_rows):
+                writer.write(chunk)
+        except BaseException:
+            writer.discard()
+            raise
+        writer.close()
+        os.chmod(tmp, 0o644)  # mkstemp crée en 0600
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+def read_table(path: str) -> pd.DataFrame:
+    # Relecture complète d'un export, lecteur choisi selon l'extension
+    ext = os.path.splitext(path)[1]
+    if ext == ".csv":
+        return pd.read_csv(path)
+    pa, _ = _pyarrow()
+    if ext == ".parquet":
+        return pd.read_parquet(path)
+    if ext == ".arrow":
+        with pa.ipc.open_stream(path) as reader:
+            return reader.read_all().to_pandas()
+    raise ValueError(f"Extension d'export inconnue : {ext!r} (attendu : {', '.join(EXTENSIONS.values())})")
+
+def read_head(path: str, n: int = 50) -> pd.DataFrame:
+    # Aperçu sans relire tout le fichier
+    ext = os.path.splitext(path)[1]
+    if ext == ".csv":
+        if os.path.getsize(path) == 0:
+            return pd.DataFrame()
+        return pd.read_csv(path, nrows=n)
+    pa, _ = _pyarrow()
+    if ext == ".parquet":
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        batch = next(pf.iter_batches(batch_size=n), None)
+        return batch.to_pandas() if batch is not None else pd.DataFrame()
+    with pa.ipc.open_stream(path) as reader:
+        batches, rows = [], 0
+        for b in reader:
+            batches.append(b)
+            rows += b.num_rows
+            if rows >= n:
+                break
+    if not batches:
+        return pd.DataFrame()
+    return pa.Table.from_batches(batches).to_pandas().head(n)
+
+def session_dir(root: str = "exports", ttl_hours: float = 24.0) -> str:
+    # Nouveau dossier d'export de session ; purge au passage les dossiers de session inactifs
+    prune_sessions(root, ttl_hours)
+    return os.path.join(root, uuid.uuid4().hex[:12])
+
+def prune_sessions(root: str = "exports", ttl_hours: float = 24.0) -> int:
+    # Supprime les sous-dossiers de session non modifiés depuis ttl_hours ; renvoie leur nombre
+    if ttl_hours is None or ttl_hours <= 0 or not os.path.isdir(root):
+        return 0
+    limit = time.time() - ttl_hours * 3600
+    removed = 0
+    for entry in os.scandir(root):
+        try:
+            if entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < limit:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        except FileNotFoundError:  # purgé en même temps par une autre session
+            continue
+    return removed
+
+def latest_export(name: str, root: str = "exports") -> str:
+    # Export le plus récent toutes sessions confondues (ex. "briefs_pro" -> exports/<session>/briefs_pro.csv)
+    paths = [p for ext in EXTENSIONS.values() for p in glob.glob(os.path.join(root, "*", name + ext))]
+    if not paths:
+        raise FileNotFoundError(f"Aucun export {name!r} sous {root}/ : génère-le depuis l'app ou passe son chemin")
+    return max(paths, key=os.path.getmtime)
+
+def mime_type(path: str) -> str:
+    ext = os.path.splitext(path)[1]
+    for fmt, e in EXTENSIONS.items():
+        if e == ext:
+            return MIME_TYPES[fmt]
+    return "application/octet-stream"
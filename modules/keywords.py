@@ -1,23 +1,31 @@
-import re
-from typing import List, Dict, Any, Tuple
+import argparse, hashlib, os, re, tempfile
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, Optional
+import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
-from sentence_transformers import SentenceTransformer
+from modules.embeddings import EmbeddingBackend, dequantize
+from modules.registry import lazy_import
+from modules.exports import write_table
+from modules.artifacts import SHARED_MODE, prune_sites
 
 def normalize_kw(k: str) -> str:
     k = k.strip().lower()
     k = re.sub(r"\s+", " ", k)
     return k
 
-def cluster_keywords(keywords: List[str], n_clusters: int = None, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2") -> pd.DataFrame:
+def outline_h2(pillar: str) -> List[str]:
+    return [f"Guide: {pillar.title()}", "Matériel et supports", "Techniques et erreurs fréquentes", "FAQ et cas particuliers"]
+
+def cluster_keywords(keywords: List[str], n_clusters: int = None, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2", embeddings: Dict[str, Any] = None) -> pd.DataFrame:
     kws = [normalize_kw(k) for k in keywords if k and k.strip()]
     kws = list(dict.fromkeys(kws))
     if len(kws) < 2:
         return pd.DataFrame(columns=["keyword", "cluster"])
-    model = SentenceTransformer(model_name)
-    emb = model.encode(kws, normalize_embeddings=True)
+    # embeddings : section "embeddings" de config.yaml (backend, storage_dtype, token_budget…)
+    backend = EmbeddingBackend.from_config({"similarity": {"model_name": model_name}, "embeddings": embeddings})
+    emb = dequantize(backend.encode(kws))
     if n_clusters is None:
         n_clusters = max(2, int(len(kws) ** 0.5))
+    KMeans = lazy_import("sklearn.cluster").KMeans
     km = KMeans(n_clusters=n_clusters, n_init="auto", random_state=42)
     labels = km.fit_predict(emb)
     df = pd.DataFrame({"keyword": kws, "cluster": labels})
@@ -26,12 +34,250 @@ def cluster_keywords(keywords: List[str], n_clusters: int = None, model_name: st
     for c, sub in df.groupby("cluster"):
         pillar = max(sub["keyword"], key=lambda s: len(s.split()))
         satellites = [k for k in sub["keyword"].tolist() if k != pillar][:12]
-        h2s = [f"Guide: {pillar.title()}", "Matériel et supports", "Techniques et erreurs fréquentes", "FAQ et cas particuliers"]
+        h2s = outline_h2(pillar)
         outlines.append({"cluster": int(c), "pillar": pillar, "satellites": satellites, "h2": h2s})
     out_df = pd.DataFrame(outlines)
     return df.merge(out_df, on="cluster", how="left")
 
-def export_cocons_to_csv(df: pd.DataFrame, path: str = "exports/cocons_keywords.csv"):
-    import os
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    df.to_csv(path, index=False)
+def export_cocons_to_csv(df: pd.DataFrame, path: str = "exports/cocons_keywords.csv", fmt: str = "csv", chunk_rows: int = 5000) -> str:
+    return write_table(df, path, fmt, chunk_rows)
+
+# --- Mode grande échelle (50k–500k mots-clés) ---
+
+LARGE_DEFAULTS = {
+    "method": "minibatch",
+    "encode_chunk": 20000,
+    "batch_size": 4096,
+    "epochs": 2,
+    "knn_k": 10,
+    "n_probe": 8,
+    "min_similarity": 0.6,
+    "lp_iterations": 20,
+    "cache_root": "artifacts",
+    "threshold": 5000,
+}
+
+def keywords_large_cfg(cfg: dict) -> Dict[str, Any]:
+    out = dict(LARGE_DEFAULTS)
+    out.update((cfg or {}).get("keywords_large", {}) or {})
+    return out
+
+def read_keywords_csv(path: str, column: Optional[str] = None, chunksize: int = 50000) -> Iterator[str]:
+    # Lecture par chunks d'un export de recherche de mots-clés (colonne "keyword" ou 1re colonne)
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False):
+        col = column or next((c for c in chunk.columns if c.lower() in ("keyword", "mot-clé", "mot clé", "requête", "query")), chunk.columns[0])
+        yield from chunk[col].tolist()
+
+def encode_keywords_to_disk(kws: List[str], cfg: dict, chunk: int = 20000, cache_root: str = "artifacts") -> np.ndarray:
+    # Embeddings écrits chunk par chunk dans un .npy, réutilisé tel quel si la liste n'a pas changé
+    backend = EmbeddingBackend.from_config(cfg)
+    h = hashlib.sha1()
+    h.update(f"{backend.model_name}|{backend.backend}|{backend.storage_dtype}".encode("utf-8"))
+    for k in kws:
+        h.update(k.encode("utf-8"))
+        h.update(b"\n")
+    site = os.path.join(cache_root, f"keywords-{h.hexdigest()[:12]}")
+    path = os.path.join(site, "embeddings.npy")
+    if os.path.exists(path):
+        os.utime(site)  # réutilisé = récent pour l'éviction
+        return np.load(path, mmap_mode="r")
+    os.makedirs(site, exist_ok=True)
+    # éviction des anciens caches de mots-clés (même règle que les dossiers d'artefacts)
+    prune_sites(site, int((cfg.get("artifacts") or {}).get("keep_per_domain", 3)))
+    dim = backend.model.get_sentence_embedding_dimension()
+    dtype = {"float32": np.float32, "float16": np.float16, "int8": np.int8}[backend.storage_dtype]
+    # fichier temporaire unique par écrivain, puis remplacement atomique
+    fd, tmp = tempfile.mkstemp(dir=site, prefix="embeddings.", suffix=".npy.tmp")
+    os.close(fd)
+    try:
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=dtype, shape=(len(kws), dim))
+        for start in range(0, len(kws), chunk):
+            out[start:start + chunk] = backend.encode(kws[start:start + chunk])
+        out.flush()
+        del out
+        os.chmod(tmp, SHARED_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return np.load(path, mmap_mode="r")
+
+def _minibatch_labels(emb: np.ndarray, n_clusters: int, batch_size: int, epochs: int, seed: int = 42) -> np.ndarray:
+    MiniBatchKMeans = lazy_import("sklearn.cluster").MiniBatchKMeans
+    n = emb.shape[0]
+    step = max(batch_size, 3 * n_clusters)  # chaque partial_fit doit voir >= n_clusters points
+    km = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, n_init=3, random_state=seed)
+    rng = np.random.default_rng(seed)
+    starts = np.arange(0, n, step)
+    if len(starts) > 1 and n - starts[-1] < step:
+        # bloc de queue trop court fusionné avec le précédent : l'ordre mélangé peut le placer en 1er
+        starts = starts[:-1]
+    chunks = list(zip(starts, np.append(starts[1:], n)))
+    for _ in range(epochs):
+        for i in rng.permutation(len(chunks)):
+            start, end = chunks[i]
+            km.partial_fit(dequantize(emb[start:end]))
+    labels = np.empty(n, dtype=np.int64)
+    for start, end in chunks:
+        labels[start:end] = km.predict(dequantize(emb[start:end]))
+    return labels
+
+def _knn_graph(emb: np.ndarray, k: int, n_probe: int, batch_size: int, chunk: int, seed: int = 42):
+    # k-NN approché type IVF : quantifieur grossier MiniBatchKMeans, chaque cellule est comparée
+    # aux n_probe cellules les plus proches (produits matriciels par blocs)
+    MiniBatchKMeans = lazy_import("sklearn.cluster").MiniBatchKMeans
+    n = emb.shape[0]
+    n_lists = max(1, int(n ** 0.5))
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(n, size=min(n, 64 * n_lists), replace=False))
+    quant = MiniBatchKMeans(n_clusters=n_lists, batch_size=batch_size, n_init=1, random_state=seed)
+    quant.fit(dequantize(emb[sample]))
+    cent = quant.cluster_centers_.astype(np.float32)
+    cent /= np.linalg.norm(cent, axis=1, keepdims=True) + 1e-9
+    assign = np.empty(n, dtype=np.int64)
+    for start in range(0, n, chunk):
+        assign[start:start + chunk] = np.argmax(dequantize(emb[start:start + chunk]) @ cent.T, axis=1)
+    order = np.argsort(assign, kind="stable")
+    bounds = np.searchsorted(assign[order], np.arange(n_lists + 1))
+    probe = np.argsort(-(cent @ cent.T), axis=1)[:, :min(n_probe, n_lists)]
+
+    k = min(k, n - 1)
+    nbr_idx = np.zeros((n, k), dtype=np.int32)
+    nbr_sim = np.full((n, k), -np.inf, dtype=np.float32)
+    for l in range(n_lists):
+        members = order[bounds[l]:bounds[l + 1]]
+        if not len(members):
+            continue
+        cand = np.sort(np.concatenate([order[bounds[m]:bounds[m + 1]] for m in probe[l]]))
+        C = dequantize(emb[cand])
+        kk = min(k, len(cand) - 1)
+        if kk <= 0:
+            continue
+        for qs in range(0, len(members), 2048):
+            q = np.sort(members[qs:qs + 2048])
+            S = dequantize(emb[q]) @ C.T
+            S[q[:, None] == cand[None, :]] = -np.inf
+            top = np.argpartition(-S, kk - 1, axis=1)[:, :kk]
+            nbr_idx[q, :kk] = cand[top]
+            nbr_sim[q, :kk] = np.take_along_axis(S, top, axis=1)
+    return nbr_idx, nbr_sim
+
+def _label_propagation(nbr_idx: np.ndarray, nbr_sim: np.ndarray, min_similarity: float, iterations: int, seed: int = 42) -> np.ndarray:
+    # Communautés par propagation de labels pondérée, entièrement vectorisée sur la liste d'arêtes
+    from scipy import sparse
+    n, k = nbr_idx.shape
+    rows = np.repeat(np.arange(n), k)
+    cols = nbr_idx.ravel().astype(np.int64)
+    w = nbr_sim.ravel().astype(np.float64)
+    keep = w >= min_similarity
+    W = sparse.csr_matrix((w[keep], (rows[keep], cols[keep])), shape=(n, n))
+    W = W.maximum(W.T).tocsr()  # graphe symétrisé
+    src = np.repeat(np.arange(n), np.diff(W.indptr))
+    dst, wt = W.indices, W.data
+    labels = np.arange(n, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    for _ in range(iterations):
+        if not len(src):
+            break
+        key = src * n + labels[dst]
+        uniq, inv = np.unique(key, return_inverse=True)
+        votes = np.bincount(inv, weights=wt)
+        node, lab = uniq // n, uniq % n
+        # label le plus voté par nœud (égalité : plus petit label)
+        o = np.lexsort((lab, -votes, node))
+        first = o[np.r_[True, node[o][1:] != node[o][:-1]]]
+        proposal = labels.copy()
+        proposal[node[first]] = lab[first]
+        # mise à jour d'une moitié aléatoire des nœuds : évite les oscillations synchrones
+        changed = (proposal != labels) & (rng.random(n) < 0.5)
+        if changed.sum() < max(1, n // 1000):
+            labels[changed] = proposal[changed]
+            break
+        labels[changed] = proposal[changed]
+    return np.unique(labels, return_inverse=True)[1]
+
+def _outlines(kws: np.ndarray, labels: np.ndarray, n_sat: int = 12):
+    # pilier = mot-clé le plus long (en mots) du cluster, 1er en cas d'égalité ; satellites = 12 premiers autres
+    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+    words = np.fromiter((k.count(" ") + 1 for k in kws), dtype=np.int64, count=len(kws))
+    pos = np.arange(len(kws))
+    o = np.lexsort((pos, -words, labels))
+    first = o[np.r_[True, labels[o][1:] != labels[o][:-1]]]
+    pillar_idx = np.full(n_clusters, -1, dtype=np.int64)
+    pillar_idx[labels[first]] = first
+    pillars = kws[pillar_idx]
+    o = np.lexsort((pos, labels))
+    o = o[o != pillar_idx[labels[o]]]
+    starts = np.searchsorted(labels[o], np.arange(n_clusters))
+    rank = np.arange(len(o)) - starts[labels[o]]
+    sat = o[rank < n_sat]
+    satellites = [[] for _ in range(n_clusters)]
+    for i in sat:
+        satellites[labels[i]].append(kws[i])
+    sat_str = np.array([str(s) for s in satellites], dtype=object)
+    h2_str = np.array([str(outline_h2(p)) for p in pillars], dtype=object)
+    return pillars, sat_str, h2_str
+
+def cluster_keywords_large(keywords: Iterable[str], cfg: dict, out_path: str = "exports/cocons_keywords.csv",
+                           method: Optional[str] = None, n_clusters: Optional[int] = None,
+                           fmt: str = "csv", chunk_rows: int = 50000) -> Dict[str, Any]:
+    lcfg = keywords_large_cfg(cfg)
+    method = method or lcfg["method"]
+    kws = np.array(list(dict.fromkeys(normalize_kw(k) for k in keywords if k and k.strip())), dtype=object)
+    if len(kws) < 2:
+        raise ValueError("Au moins deux mots-clés distincts sont nécessaires.")
+    if method not in ("minibatch", "graph"):
+        raise ValueError(f"Méthode inconnue : {method!r} (attendu : minibatch, graph)")
+    warning = ""
+    if method == "graph" and n_clusters:
+        # la propagation de labels fixe elle-même le nombre de clusters
+        warning = f"n_clusters={n_clusters} ignoré : la méthode 'graph' déduit le nombre de clusters (min_similarity, knn_k)"
+    emb = encode_keywords_to_disk(kws.tolist(), cfg, int(lcfg["encode_chunk"]), lcfg["cache_root"])
+
+    if method == "minibatch":
+        k = n_clusters or max(2, int(len(kws) ** 0.5))
+        labels = _minibatch_labels(emb, k, int(lcfg["batch_size"]), int(lcfg["epochs"]))
+    else:
+        nbr_idx, nbr_sim = _knn_graph(emb, int(lcfg["knn_k"]), int(lcfg["n_probe"]), int(lcfg["batch_size"]), int(lcfg["encode_chunk"]))
+        labels = _label_propagation(nbr_idx, nbr_sim, float(lcfg["min_similarity"]), int(lcfg["lp_iterations"]))
+    labels = np.unique(labels, return_inverse=True)[1]
+
+    pillars, sat_str, h2_str = _outlines(kws, labels)
+
+    def frames():
+        # mêmes colonnes que cluster_keywords, écrites chunk par chunk
+        for start in range(0, len(kws), chunk_rows):
+            lab = labels[start:start + chunk_rows]
+            yield pd.DataFrame({
+                "keyword": kws[start:start + chunk_rows],
+                "cluster": lab,
+                "pillar": pillars[lab],
+                "satellites": sat_str[lab],
+                "h2": h2_str[lab],
+            })
+
+    path = write_table(frames(), out_path, fmt, chunk_rows)
+    return {"path": path, "keywords": int(len(kws)), "clusters": int(len(pillars)), "method": method, "warning": warning}
+
+def main(argv: Optional[List[str]] = None):
+    import yaml
+    ap = argparse.ArgumentParser(description="Clustering de mots-clés à grande échelle (export en flux)")
+    ap.add_argument("input", help="CSV d'export de mots-clés")
+    ap.add_argument("--column", default=None)
+    ap.add_argument("--method", choices=["minibatch", "graph"], default=None)
+    ap.add_argument("--n-clusters", type=int, default=None, help="Méthode minibatch uniquement")
+    ap.add_argument("--out", default="exports/cocons_keywords.csv")
+    ap.add_argument("--format", default="csv", choices=["csv", "parquet", "arrow"])
+    ap.add_argument("--config", default="config.yaml")
+    args = ap.parse_args(argv)
+    with open(args.config, encoding="utf-8") as fh:
+        cfg = yaml.safe_load(fh)
+    if args.n_clusters and (args.method or keywords_large_cfg(cfg)["method"]) == "graph":
+        ap.error("--n-clusters ne s'applique pas à la méthode graph (nombre de clusters déduit du graphe k-NN)")
+    res = cluster_keywords_large(read_keywords_csv(args.input, args.column), cfg, args.out,
+                                 method=args.method, n_clusters=args.n_clusters, fmt=args.format)
+    print(f"{res['keywords']} mots-clés, {res['clusters']} clusters ({res['method']}) -> {res['path']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+from array import array
+from typing import Dict, Any, List
+from urllib.parse import urlsplit
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def node_key(url: str) -> str:
+    # Identité d'une page dans le graphe : hôte en minuscules sans port par défaut, schéma ignoré
+    # (http/https), chemin sans "/" final, fragment retiré ; la query est conservée
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+    key = host + (parts.path.rstrip("/") or "")
+    return f"{key}?{parts.query}" if parts.query else key
+
+class EdgeCollector:
+    # Accumule les liens pendant le crawl : ids entiers + tableaux int32 (pas de listes d'URLs par page)
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.src = array("i")
+        self.dst = array("i")
+        self.aliases: List[tuple] = []
+
+    def node(self, url: str) -> int:
+        return self.ids.setdefault(node_key(url), len(self.ids))
+
+    def add(self, src_url: str, dst_url: str):
+        self.src.append(self.node(src_url))
+        self.dst.append(self.node(dst_url))
+
+    def alias(self, alias_url: str, page_url: str):
+        # Autre URL de la même page (redirection) : les liens vers l'alias comptent pour la page
+        if node_key(alias_url) != node_key(page_url):
+            self.aliases.append((node_key(alias_url), node_key(page_url)))
+
+    def to_graph(self, page_urls: List[str]) -> Dict[str, Any]:
+        # Restreint aux pages crawlées (ordre des docs) et construit la CSR
+        to_page = np.full(len(self.ids), -1, dtype=np.int32)
+        page_of = {}
+        for i, u in enumerate(page_urls):
+            page_of.setdefault(node_key(u), i)
+        for alias_key, page_key in self.aliases:
+            if page_key in page_of:
+                page_of.setdefault(alias_key, page_of[page_key])
+        for key, i in page_of.items():
+            nid = self.ids.get(key)
+            if nid is not None:
+                to_page[nid] = i
+        src = to_page[np.frombuffer(self.src, dtype=np.int32)] if len(self.src) else np.empty(0, np.int32)
+        dst = to_page[np.frombuffer(self.dst, dtype=np.int32)] if len(self.dst) else np.empty(0, np.int32)
+        keep = (src >= 0) & (dst >= 0) & (src != dst)
+        return graph_from_edges(page_urls, src[keep], dst[keep])
+
+def graph_from_edges(page_urls: List[str], src: np.ndarray, dst: np.ndarray) -> Dict[str, Any]:
+    n = len(page_urls)
+    adj = sparse.csr_matrix((np.ones(len(src), dtype=np.bool_), (src, dst)), shape=(n, n))
+    adj.sum_duplicates()  # liens répétés sur une même page : une seule arête
+    adj.indices = adj.indices.astype(np.int32, copy=False)
+    adj.indptr = adj.indptr.astype(np.int64, copy=False)
+    # degrés entrants et PageRank calculés une fois à la construction, réutilisés ensuite
+    return {"urls": list(page_urls), "adj": adj, "in_degree": in_degree(adj), "pagerank": pagerank(adj)}
+
+def in_degree(adj) -> np.ndarray:
+    return np.bincount(adj.indices, minlength=adj.shape[0]).astype(np.int64)
+
+def out_degree(adj) -> np.ndarray:
+    return np.diff(adj.indptr).astype(np.int64)
+
+def orphan_pages(adj) -> np.ndarray:
+    # Pages crawlées qu'aucune autre page crawlée ne lie
+    return np.flatnonzero(in_degree(adj) == 0)
+
+def pagerank(adj, damping: float = 0.85, tol: float = 1e-6, max_iter: int = 100) -> np.ndarray:
+    n = adj.shape[0]
+    if n == 0:
+        return np.empty(0)
+    out = out_degree(adj).astype(np.float64)
+    dangling = out == 0
+    inv_out = np.divide(1.0, out, out=np.zeros(n), where=~dangling)
+    at = adj.T.tocsr().astype(np.float64)
+    r = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        nxt = damping * (at @ (r * inv_out))
+        nxt += (damping * r[dangling].sum() + 1.0 - damping) / n
+        if np.abs(nxt - r).sum() < tol:
+            r = nxt
+            break
+        r = nxt
+    return r
+
+def graph_stats(graph: Dict[str, Any]):
+    # (in_degree, pagerank) du graphe ; complète une fois un graphe construit sans ces clés
+    if graph.get("in_degree") is None:
+        graph["in_degree"] = in_degree(graph["adj"])
+    if graph.get("pagerank") is None:
+        graph["pagerank"] = pagerank(graph["adj"])
+    return graph["in_degree"], graph["pagerank"]
+
+def link_metrics(graph: Dict[str, Any]) -> pd.DataFrame:
+    indeg, pr = graph_stats(graph)
+    return pd.DataFrame({
+        "url": graph["urls"],
+        "in_degree": indeg,
+        "out_degree": out_degree(graph["adj"]),
+        "pagerank": pr,
+        "orpheline": indeg == 0,
+    })
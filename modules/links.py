@@ -1,23 +1,67 @@
 import pandas as pd
 import numpy as np
+from modules.linkgraph import graph_stats
 
-def suggest_links(analysis, clusters_df, sim, cfg):
+def suggest_links(analysis, clusters_df, sim, cfg, graph=None):
     urls = clusters_df["url"].tolist()
-    idx = {u:i for i,u in enumerate(urls)}
+    labels = clusters_df["cluster"].to_numpy()
+    n = len(urls)
+    link_cfg = cfg["linking"]
+
+    # Graphe de liens existants (crawl) réaligné sur l'ordre de clusters_df
+    existing = None
+    if graph is not None:
+        g_index = {u: i for i, u in enumerate(graph["urls"])}
+        pos = np.array([g_index.get(u, -1) for u in urls], dtype=np.int64)
+        g_to_c = np.full(len(graph["urls"]), -1, dtype=np.int64)
+        g_to_c[pos[pos >= 0]] = np.flatnonzero(pos >= 0)
+        adj = graph["adj"]
+        indeg, pr = graph_stats(graph)  # calculés à la construction du graphe
+        if len(pr) and pr.max() > 0:
+            pr = pr / pr.max()
+        # pos == -1 (page absente du graphe) pointe sur le 0 ajouté en fin de tableau
+        target_pr = np.append(pr, 0.0)[pos]
+        target_in = np.append(indeg, 0)[pos]
+        existing = (adj, pos, g_to_c)
+    exclude_existing = link_cfg.get("exclude_existing", True)
+    equity_weight = float(link_cfg.get("equity_weight", 0.0))
+
     rows = []
     for i,u in enumerate(urls):
-        c = clusters_df.iloc[i]["cluster"]
-        # tri par similarité desc
-        sims = [(urls[j], float(sim[i,j])) for j in range(len(urls)) if j!=i]
-        sims.sort(key=lambda x: x[1], reverse=True)
+        sims = np.asarray(sim[i], dtype=np.float64)
+        score = sims.copy()
+        linked = np.zeros(n, dtype=bool)
+        if existing is not None:
+            adj, pos, g_to_c = existing
+            if pos[i] >= 0:
+                cols = g_to_c[adj.indices[adj.indptr[pos[i]]:adj.indptr[pos[i]+1]]]
+                linked[cols[cols >= 0]] = True
+            # bonus d'équité : favorise les cibles peu liées / à faible PageRank
+            score = score + equity_weight * (1.0 - target_pr)
+        candidates = np.ones(n, dtype=bool)
+        candidates[i] = False
+        if exclude_existing:
+            candidates &= ~linked
+        # tri par score desc (similarité + équité éventuelle)
+        order = np.flatnonzero(candidates)
+        order = order[np.argsort(-score[order], kind="stable")]
         # intra-cluster puis cross
-        intra = [ (v,s) for v,s in sims if clusters_df.iloc[idx[v]]["cluster"]==c ][:cfg["linking"]["intra_cluster_topk"]]
-        cross = [ (v,s) for v,s in sims if clusters_df.iloc[idx[v]]["cluster"]!=c ][:cfg["linking"]["cross_cluster_topk"]]
-        for v,s in intra+cross:
-            rows.append({
+        same = labels[order] == labels[i]
+        intra = order[same][:link_cfg["intra_cluster_topk"]]
+        cross = order[~same][:link_cfg["cross_cluster_topk"]]
+        for j in np.concatenate([intra, cross]):
+            row = {
                 "source_url": u,
-                "target_url": v,
-                "similarité": round(s,3),
-                "priorité": 1 if clusters_df.iloc[idx[v]]["cluster"]==c else 2
-            })
+                "target_url": urls[j],
+                "similarité": round(float(sims[j]),3),
+                "priorité": 1 if labels[j]==labels[i] else 2
+            }
+            if existing is not None:
+                row.update({
+                    "lien_existant": bool(linked[j]),
+                    "in_degree_cible": int(target_in[j]),
+                    "pagerank_cible": round(float(target_pr[j]),4),
+                    "score": round(float(score[j]),3),
+                })
+            rows.append(row)
     return pd.DataFrame(rows)
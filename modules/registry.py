@@ -0,0 +1,94 @@
+import importlib, sys, threading, time
+from typing import Any, Callable, Dict, Hashable, List, Optional
+import pandas as pd
+
+# Registre de modèles par process : chaque modèle (spaCy, SentenceTransformer) est chargé une
+# seule fois, éventuellement en tâche de fond au démarrage, avec mesure des temps d'import/chargement.
+
+_MODELS: Dict[Hashable, Any] = {}
+_LOCKS: Dict[Hashable, threading.Lock] = {}
+_GLOBAL = threading.Lock()
+_TIMINGS: List[Dict[str, Any]] = []
+_PRELOAD: Optional[threading.Thread] = None
+
+def _record(kind: str, name: str, seconds: float, error: str = ""):
+    with _GLOBAL:
+        _TIMINGS.append({
+            "type": kind,
+            "nom": name,
+            "secondes": round(seconds, 3),
+            "thread": threading.current_thread().name,
+            "erreur": error,
+        })
+
+def _lock_for(key: Hashable) -> threading.Lock:
+    with _GLOBAL:
+        return _LOCKS.setdefault(key, threading.Lock())
+
+def lazy_import(name: str):
+    # Import au premier usage (spaCy, sklearn, sentence_transformers/torch) avec mesure du temps
+    mod = sys.modules.get(name)
+    if mod is not None:
+        return mod
+    t0 = time.perf_counter()
+    mod = importlib.import_module(name)
+    _record("import", name, time.perf_counter() - t0)
+    return mod
+
+def get_model(key: Hashable, loader: Callable[[], Any], label: str = "") -> Any:
+    if key in _MODELS:
+        return _MODELS[key]
+    # verrou par modèle : un appel concurrent attend le chargement en cours (ex. préchargement)
+    with _lock_for(key):
+        if key in _MODELS:
+            return _MODELS[key]
+        t0 = time.perf_counter()
+        model = loader()
+        _record("modèle", label or str(key), time.perf_counter() - t0)
+        _MODELS[key] = model
+    return model
+
+def is_loaded(key: Hashable) -> bool:
+    return key in _MODELS
+
+def spacy_model(model_name: str):
+    def load():
+        spacy = lazy_import("spacy")
+        try:
+            return spacy.load(model_name)
+        except OSError:
+            raise RuntimeError(f"Modèle spaCy '{model_name}' non installé. Lance: python -m spacy download {model_name}")
+    return get_model(("spacy", model_name), load, f"spaCy {model_name}")
+
+def preload(cfg: dict) -> threading.Thread:
+    # Lance (une seule fois par process) le chargement des modèles en arrière-plan
+    global _PRELOAD
+    with _GLOBAL:
+        if _PRELOAD is not None:
+            return _PRELOAD
+
+        def run():
+            from modules.embeddings import EmbeddingBackend
+            tasks = [
+                ("sklearn", lambda: (lazy_import("sklearn.feature_extraction.text"), lazy_import("sklearn.cluster"))),
+                ("spaCy", lambda: spacy_model(cfg["nlp"]["spacy_model"])),
+                ("embeddings", lambda: EmbeddingBackend.from_config(cfg).model),
+            ]
+            for name, task in tasks:
+                t0 = time.perf_counter()
+                try:
+                    task()
+                except Exception as e:
+                    # l'erreur sera relevée au premier usage réel, dans le thread principal
+                    _record("préchargement", name, time.perf_counter() - t0, str(e))
+
+        _PRELOAD = threading.Thread(target=run, name="model-preload", daemon=True)
+        _PRELOAD.start()
+        return _PRELOAD
+
+def preload_running() -> bool:
+    return _PRELOAD is not None and _PRELOAD.is_alive()
+
+def timings() -> pd.DataFrame:
+    with _GLOBAL:
+        return pd.DataFrame(list(_TIMINGS), columns=["type", "nom", "secondes", "thread", "erreur"])